@@ -0,0 +1,66 @@
+# ai_core/benchmark.py
+#
+# Throughput of the recommendation entry points. Run from the repo root:
+#
+#     python -m ai_core.benchmark
+#     python -m ai_core.benchmark --sizes 10000 1000000
+
+import argparse
+import time
+
+import numpy as np
+
+from ai_core.service_interface import (
+    get_ai_recommendation,
+    get_ai_recommendations_batch,
+    recommendation_cache
+)
+
+
+def make_features(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    features = np.empty(n, dtype=[("phonological_score", "f8"), ("naming_speed_score", "f8")])
+    features["phonological_score"] = rng.random(n)
+    features["naming_speed_score"] = rng.random(n)
+    return features
+
+
+def bench_batch(features: np.ndarray, repeats: int = 3) -> float:
+    """Best-of-`repeats` rows/s for the vectorized batch call."""
+    best = float("inf")
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        get_ai_recommendations_batch(features=features)
+        best = min(best, time.perf_counter() - start)
+
+    return len(features) / best
+
+
+def bench_loop(features: np.ndarray) -> float:
+    """rows/s calling the single-dict API once per child."""
+    rows = [
+        {"phonological_score": float(p), "naming_speed_score": float(n)}
+        for p, n in zip(features["phonological_score"], features["naming_speed_score"])
+    ]
+
+    start = time.perf_counter()
+    for row in rows:
+        get_ai_recommendation(row)
+    return len(rows) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recommendation throughput")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--loop-rows", type=int, default=10_000,
+                        help="rows used to time the per-dict loop")
+    args = parser.parse_args()
+
+    loop_rate = bench_loop(make_features(args.loop_rows))
+    print(f"single-dict loop   {args.loop_rows:>10,} rows  {loop_rate:>14,.0f} rows/s  "
+          f"cache hit rate {recommendation_cache.stats()['hit_rate']:.1%}")
+
+    for size in args.sizes:
+        rate = bench_batch(make_features(size))
+        print(f"vectorized batch   {size:>10,} rows  {rate:>14,.0f} rows/s")
@@ -0,0 +1,174 @@
+# ai_core/model_registry.py
+#
+# Lazy, hot-swappable model registry.
+#
+# Nothing is loaded at import time: the first call to get()/use() loads the
+# model (or warm_up() does it early on a background thread). swap() loads a
+# new version completely before publishing it with a single reference
+# assignment, so calls already inside use() finish on the version they
+# started with.
+#
+# Weight files are .npy arrays opened with mmap_mode="r", so several uvicorn
+# workers loading the same file share its pages through the OS page cache.
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class ThresholdModel:
+    """Placeholder classifier: risk tiers from sorted cutoffs on the risk score."""
+
+    cutoffs: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.cutoffs.nbytes)
+
+    @property
+    def memory_mapped(self) -> bool:
+        return isinstance(self.cutoffs, np.memmap)
+
+    def predict_tiers(self, risk_score: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.cutoffs, risk_score, side="right").astype(np.int8)
+
+
+def save_weights(path: str, weights) -> None:
+    """Writes weights in the .npy layout that load_weights memory-maps."""
+    np.save(path, np.asarray(weights, dtype=np.float64))
+
+
+def load_weights(path: str) -> np.ndarray:
+    return np.load(path, mmap_mode="r")
+
+
+class ModelVersion:
+
+    def __init__(self, version: str, model: Any, source: Optional[str], load_seconds: float):
+        self.version = version
+        self.model = model
+        self.source = source
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.in_flight = 0
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "load_seconds": self.load_seconds,
+            "weights_bytes": getattr(self.model, "nbytes", None),
+            "memory_mapped": getattr(self.model, "memory_mapped", False),
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight
+        }
+
+
+class ModelRegistry:
+
+    def __init__(
+        self,
+        loader: Callable[[Optional[str]], Any],
+        source: Optional[str] = None,
+        history_size: int = 5
+    ):
+        self.loader = loader
+        self.source = source
+        self.history_size = history_size
+
+        self._current: Optional[ModelVersion] = None
+        self._load_lock = threading.Lock()
+        self._flight_lock = threading.Lock()
+        self._history: List[dict] = []
+        self._swap_listeners: List[Callable[[ModelVersion, Optional[ModelVersion]], None]] = []
+        self._loads = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._current is not None
+
+    def get(self) -> ModelVersion:
+        current = self._current
+
+        if current is not None:
+            return current
+
+        with self._load_lock:
+            if self._current is None:
+                self._current = self._load(self.source, version=None)
+
+            return self._current
+
+    @contextmanager
+    def use(self):
+        """Pins the current version for the duration of one call."""
+        version = self.get()
+
+        with self._flight_lock:
+            version.in_flight += 1
+
+        try:
+            yield version
+        finally:
+            with self._flight_lock:
+                version.in_flight -= 1
+
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        if not background:
+            self.get()
+            return None
+
+        thread = threading.Thread(target=self.get, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def swap(self, source: Optional[str] = None, version: Optional[str] = None) -> ModelVersion:
+        """Loads `source` as a new version, then atomically makes it current."""
+        with self._load_lock:
+            new = self._load(source, version)
+            old, self._current = self._current, new
+            self.source = source
+
+            if old is not None:
+                self._history.append(old.describe())
+                del self._history[:-self.history_size]
+
+        for listener in list(self._swap_listeners):
+            listener(new, old)
+
+        return new
+
+    def on_swap(self, listener: Callable[[ModelVersion, Optional[ModelVersion]], None]):
+        """Registers `listener(new_version, old_version)`, called after each swap."""
+        self._swap_listeners.append(listener)
+        return listener
+
+    def stats(self) -> Dict[str, Any]:
+        current = self._current
+
+        return {
+            "loaded": current is not None,
+            "current": current.describe() if current is not None else None,
+            "previous": list(self._history),
+            "loads": self._loads
+        }
+
+    def _load(self, source: Optional[str], version: Optional[str]) -> ModelVersion:
+        # Caller holds the load lock.
+        started = time.perf_counter()
+        model = self.loader(source)
+        elapsed = time.perf_counter() - started
+
+        self._loads += 1
+
+        return ModelVersion(
+            version=version or f"v{self._loads}",
+            model=model,
+            source=source,
+            load_seconds=elapsed
+        )
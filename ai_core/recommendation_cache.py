@@ -0,0 +1,118 @@
+# ai_core/recommendation_cache.py
+#
+# LRU memo for single-child recommendations.
+#
+# Feature vectors are snapped to a grid of `quantum` to form the lookup key,
+# but the recommendation is always computed from the exact features. A result
+# is stored only when the caller confirms that every vector in its grid cell
+# gets the same answer, so a hit never differs from a fresh computation;
+# cells that straddle a decision cutoff are computed every time. Entries are
+# also keyed by model version; the registry clears the cache on swap.
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+
+class RecommendationCache:
+
+    def __init__(self, max_entries: int = 4096, quantum: float = 0.001):
+        if quantum < 0:
+            raise ValueError("quantum must be >= 0")
+
+        self.max_entries = max_entries
+        self.quantum = quantum
+
+        self._entries: "OrderedDict[Tuple[Hashable, ...], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.clears = 0
+
+    def quantize(self, features: Sequence[float]) -> Tuple[Any, ...]:
+        """Cache key cells for one feature vector."""
+        if not self.quantum:
+            return tuple(float(value) for value in features)
+
+        return tuple(math.floor(float(value) / self.quantum + 0.5) for value in features)
+
+    def cell_bounds(self, cells: Tuple[Any, ...]) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+        """
+        (low, high) corners enclosing a cell, padded by half a cell on each
+        side so rounding at the cell edges cannot put a vector outside them.
+        """
+        if not self.quantum:
+            return cells, cells
+
+        return (
+            tuple((cell - 1) * self.quantum for cell in cells),
+            tuple((cell + 1) * self.quantum for cell in cells)
+        )
+
+    def get_or_compute(
+        self,
+        version: str,
+        features: Sequence[float],
+        compute: Callable[[Sequence[float]], Any],
+        uniform: Optional[Callable[[Tuple[float, ...], Tuple[float, ...]], bool]] = None
+    ) -> Any:
+        """
+        compute(features) memoized per grid cell. `uniform(low, high)` says
+        whether every vector between the cell's corners gets the same
+        answer; without it only exact keys (quantum 0) are stored.
+        """
+        cells = self.quantize(features)
+        key = (version,) + cells
+
+        with self._lock:
+            cached = self._entries.get(key)
+
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+
+            self.misses += 1
+
+        # Computed outside the lock; two racing misses just store the same value.
+        value = compute(features)
+
+        if self.quantum:
+            if uniform is None or not uniform(*self.cell_bounds(cells)):
+                with self._lock:
+                    self.uncacheable += 1
+
+                return value
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return value
+
+    def clear(self, *_):
+        """Drops every entry; usable directly as a ModelRegistry.on_swap listener."""
+        with self._lock:
+            self._entries.clear()
+            self.clears += 1
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "quantum": self.quantum,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "uncacheable": self.uncacheable,
+                "clears": self.clears
+            }
@@ -1,43 +1,248 @@
 # ai_core/service_interface.py (Placeholder - Simulates ML model response)
 
-from typing import Dict, Any
+import os
+import threading
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from ai_core.model_registry import ModelRegistry, ThresholdModel, load_weights
+from ai_core.recommendation_cache import RecommendationCache
+from ai_core.similarity_index import SimilarityIndex
+
+# Risk tiers, indexed by the codes returned from get_ai_recommendations_batch.
+# A risk score below RISK_CUTOFFS[0] is tier 0 (High), below RISK_CUTOFFS[1]
+# tier 1 (Moderate), otherwise tier 2 (Low).
+RISK_CUTOFFS = np.array([0.3, 0.6])
+
+RISK_LEVELS = ("High", "Moderate", "Low")
+
+# Corrected module name to match MOCK_QUESTS
+MODULE_NAMES = (
+    "Foundational-Phonics-Level-1",
+    "Decoding-Blends-Level-3",
+    "Syllable-Division-Level-5",
+)
+
+DETAIL_MESSAGES = (
+    "Critical need for multisensory phonological awareness training.",
+    "Focus on decoding efficiency and rapid naming speed.",
+    "Continue practice; focus on fluency and comprehension strategies.",
+)
+
+_RISK_LEVEL_ARRAY = np.array(RISK_LEVELS)
+_MODULE_NAME_ARRAY = np.array(MODULE_NAMES)
+
 
 # Mock Model Load: Pretend to load a joblib or H5 model
-def load_ml_model():
-    """Placeholder for loading the trained AI model."""
+def load_ml_model(path: Optional[str] = None) -> ThresholdModel:
+    """
+    Placeholder for loading the trained AI model.
+
+    With `path`, the cutoffs are memory-mapped from a .npy weight file;
+    otherwise the built-in RISK_CUTOFFS are used.
+    """
     print("--- INFO: Loading Mock AI Recommendation Model ---")
-    return True # Pretend the model is loaded
 
-MODEL_LOADED = load_ml_model()
+    if path:
+        return ThresholdModel(load_weights(path))
+
+    return ThresholdModel(RISK_CUTOFFS)
+
+
+# Loaded on first use, not at import. Set AI_MODEL_WARMUP=1 to load on a
+# background thread as soon as this module is imported.
+model_registry = ModelRegistry(load_ml_model, source=os.getenv("AI_MODEL_PATH") or None)
+
+if os.getenv("AI_MODEL_WARMUP", "0") == "1":
+    model_registry.warm_up(background=True)
+
+# Single-child answers memoized on features rounded to AI_CACHE_QUANTUM
+# (0 disables rounding). Answers are computed from the exact features and
+# only grid cells clear of every tier cutoff are stored. Cleared whenever the
+# registry swaps versions.
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "4096")),
+    quantum=float(os.getenv("AI_CACHE_QUANTUM", "0.001"))
+)
+model_registry.on_swap(recommendation_cache.clear)
+
+
+def get_ai_recommendations_batch(
+    phonological_score=None,
+    naming_speed_score=None,
+    features: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Scores many children at once with vectorized thresholding.
+
+    Pass either two equal-length columns (`phonological_score`,
+    `naming_speed_score`) or a structured array `features` with fields of
+    those names. Returns arrays aligned with the input:
+
+        tier                     int8 codes into RISK_LEVELS / MODULE_NAMES
+        risk_score               mean of the two scores
+        risk_level               "High" / "Moderate" / "Low"
+        recommended_module_name  module id for that tier
+    """
+
+    if features is not None:
+        phonological_score = features["phonological_score"]
+        naming_speed_score = features["naming_speed_score"]
+
+    if phonological_score is None or naming_speed_score is None:
+        raise ValueError("phonological_score and naming_speed_score are required")
+
+    phonological = np.asarray(phonological_score, dtype=np.float64)
+    naming_speed = np.asarray(naming_speed_score, dtype=np.float64)
+
+    if phonological.shape != naming_speed.shape:
+        raise ValueError("Feature columns must have the same shape")
+
+    # 1. Determine Risk Level based on scores
+    # Example logic: if any score is below a threshold, risk is high
+    risk_score = (phonological + naming_speed) / 2.0
+
+    with model_registry.use() as version:
+        tier = version.model.predict_tiers(risk_score)
+
+    return {
+        "tier": tier,
+        "risk_score": risk_score,
+        "risk_level": _RISK_LEVEL_ARRAY[tier],
+        "recommended_module_name": _MODULE_NAME_ARRAY[tier]
+    }
+
 
 def get_ai_recommendation(data: Dict[str, float]) -> Dict[str, str]:
     """
     Simulates calling the AI model with assessment features.
-    
+
     In a real app, this would use the loaded model (e.g., KNN or Classifier)
     to predict the 'dyslexia subtype' and recommend the best intervention.
+    Thin wrapper over get_ai_recommendations_batch for a single child,
+    memoized in `recommendation_cache`.
     """
-    
-    # 1. Determine Risk Level based on scores
-    # Example logic: if any score is below a threshold, risk is high
-    risk_score = (data['phonological_score'] + data['naming_speed_score']) / 2.0
-    
-    if risk_score < 0.3:
-        risk_level = "High"
-        module = "Foundational-Phonics-Level-1"
-        detail_msg = "Critical need for multisensory phonological awareness training."
-    elif risk_score < 0.6:
-        risk_level = "Moderate"
-        module = "Decoding-Blends-Level-3"
-        detail_msg = "Focus on decoding efficiency and rapid naming speed."
-    else:
-        risk_level = "Low"
-        # Corrected module name to match MOCK_QUESTS
-        module = "Syllable-Division-Level-5"
-        detail_msg = "Continue practice; focus on fluency and comprehension strategies."
-        
+
+    features = (data['phonological_score'], data['naming_speed_score'])
+    version = model_registry.get()
+
+    def uniform(low, high) -> bool:
+        # Tiers rise with the risk score, so the corners decide the cell.
+        tiers = version.model.predict_tiers(np.array([sum(low) / 2.0, sum(high) / 2.0]))
+        return tiers[0] == tiers[1]
+
+    return dict(recommendation_cache.get_or_compute(
+        version.version,
+        features,
+        _recommend_one,
+        uniform
+    ))
+
+
+def _recommend_one(features) -> Dict[str, str]:
+    result = get_ai_recommendations_batch([features[0]], [features[1]])
+    tier = int(result["tier"][0])
+
     return {
-        "recommended_module_name": module,
-        "risk_level": risk_level,
-        "details": detail_msg
-    }
\ No newline at end of file
+        "recommended_module_name": MODULE_NAMES[tier],
+        "risk_level": RISK_LEVELS[tier],
+        "details": DETAIL_MESSAGES[tier]
+    }
+
+
+# --- Subtype similarity ---
+
+# Dimensions of a child's subtype vector, in order.
+SUBTYPE_TEST_TYPES = (
+    "Phoneme Popper Game",
+    "Star Tracker",
+    "Letter Mirror",
+    "Early Dyslexia Screening",
+)
+
+# Directory holding a saved index (see SimilarityIndex.save); optional.
+SUBTYPE_INDEX_DIR = os.getenv("AI_SUBTYPE_INDEX_DIR") or None
+
+
+def subtype_vector(best_by_test_type: Dict[str, float], fallback_percent: float) -> np.ndarray:
+    """
+    A child's best accuracy per SUBTYPE_TEST_TYPES, scaled to 0-1. Test types
+    the child has not played use `fallback_percent` (their rolling accuracy).
+    """
+
+    bests = best_by_test_type or {}
+
+    return np.array(
+        [bests.get(test_type, fallback_percent) for test_type in SUBTYPE_TEST_TYPES],
+        dtype=np.float32
+    ) / 100.0
+
+
+def open_subtype_index(load_vectors, count_children) -> SimilarityIndex:
+    """
+    Memory-maps the index saved in SUBTYPE_INDEX_DIR and replays what changed
+    since it was saved (see refresh_subtype_index). Builds a fresh index when
+    there is no snapshot, it cannot be read, or it still disagrees with the
+    number of children from `count_children()` after the replay.
+
+    `load_vectors(since)` returns (user_ids, vectors, watermark): the vectors
+    of children scored after watermark `since`, or of every child when it is
+    None, and the watermark of the data they were read from.
+    """
+
+    if SUBTYPE_INDEX_DIR and os.path.exists(os.path.join(SUBTYPE_INDEX_DIR, "meta.json")):
+        try:
+            index = SimilarityIndex.load(SUBTYPE_INDEX_DIR, mmap=True)
+
+        except (OSError, ValueError, KeyError):
+            index = None
+
+        usable = (
+            index is not None
+            and index.dim == len(SUBTYPE_TEST_TYPES)
+            and index.watermark is not None
+            and refresh_subtype_index(index, load_vectors)
+            and len(index) == count_children()
+        )
+
+        if usable:
+            return index
+
+    user_ids, vectors, watermark = load_vectors(None)
+    index = SimilarityIndex.build(len(SUBTYPE_TEST_TYPES), vectors, user_ids)
+    index.watermark = watermark
+    return index
+
+
+_refresh_lock = threading.Lock()
+
+
+def refresh_subtype_index(index: SimilarityIndex, load_vectors) -> bool:
+    """
+    Upserts every child scored after the index's watermark, including
+    scores written by other workers. False when the data is older than the
+    index (e.g. a restored database), which calls for a rebuild.
+    """
+
+    with _refresh_lock:
+        user_ids, vectors, watermark = load_vectors(index.watermark)
+
+        if watermark < index.watermark:
+            return False
+
+        for user_id, vector in zip(user_ids, vectors):
+            index.upsert(user_id, vector)
+
+        index.watermark = watermark
+
+    return True
+
+
+def save_subtype_index(index: SimilarityIndex, load_vectors) -> bool:
+    """Brings the index up to date, then saves it; one worker at a time."""
+
+    if not SUBTYPE_INDEX_DIR or not refresh_subtype_index(index, load_vectors):
+        return False
+
+    return index.save(SUBTYPE_INDEX_DIR)
@@ -0,0 +1,465 @@
+# ai_core/similarity_index.py
+#
+# Exact k-nearest-neighbour index over assessment vectors.
+#
+# The bulk of the vectors live in a static k-d tree: points are reordered so
+# every node covers a contiguous row range, and each node stores its bounding
+# box. A query walks nodes best-first by box distance and stops as soon as
+# the next box is farther than the current k-th neighbour, so results are
+# exact while only a few leaves are scanned.
+#
+# New or updated vectors go to a small append-only delta segment that is
+# scanned with one matrix op per query. Once the delta grows past
+# `compact_threshold`, a background thread rebuilds the tree from both
+# segments and swaps it in.
+#
+# save()/load() use one .npy file per array, so load(mmap=True) maps a large
+# index instead of reading it. Each save writes a fresh snapshot directory and
+# then renames meta.json, which names the current snapshot, into place; files
+# another process has mapped are unlinked, never truncated. A lock file makes
+# one process the writer when several save the same directory at once.
+
+import heapq
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are still atomic, just not exclusive
+    fcntl = None
+
+_NO_LABELS = np.empty(0, np.int64)
+
+_TREE_ARRAYS = ("points", "labels", "node_lo", "node_hi", "node_left", "node_right", "node_min", "node_max")
+
+
+class KDTree:
+    """Immutable k-d tree; leaves hold at most `leaf_size` rows."""
+
+    def __init__(self, **arrays):
+        for name in _TREE_ARRAYS:
+            setattr(self, name, arrays[name])
+
+        self._nodes = None
+
+    @property
+    def size(self) -> int:
+        return len(self.labels)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(getattr(self, name).nbytes) for name in _TREE_ARRAYS)
+
+    @classmethod
+    def build(cls, points: np.ndarray, labels: np.ndarray, leaf_size: int = 64) -> "KDTree":
+        points = np.ascontiguousarray(points, dtype=np.float32)
+        labels = np.ascontiguousarray(labels, dtype=np.int64)
+        n, dim = points.shape
+
+        order = np.arange(n)
+        lo_list, hi_list, left_list, right_list, min_list, max_list = [], [], [], [], [], []
+
+        def new_node(lo, hi):
+            rows = points[order[lo:hi]]
+            lo_list.append(lo)
+            hi_list.append(hi)
+            left_list.append(-1)
+            right_list.append(-1)
+            min_list.append(rows.min(axis=0) if hi > lo else np.zeros(dim, np.float32))
+            max_list.append(rows.max(axis=0) if hi > lo else np.zeros(dim, np.float32))
+            return len(lo_list) - 1
+
+        stack = [new_node(0, n)]
+
+        while stack:
+            node = stack.pop()
+            lo, hi = lo_list[node], hi_list[node]
+
+            if hi - lo <= leaf_size:
+                continue
+
+            # Split the widest dimension at the median.
+            axis = int(np.argmax(max_list[node] - min_list[node]))
+            mid = (lo + hi) // 2
+            segment = order[lo:hi]
+            order[lo:hi] = segment[np.argpartition(points[segment, axis], mid - lo)]
+
+            left_list[node] = new_node(lo, mid)
+            right_list[node] = new_node(mid, hi)
+            stack.extend((left_list[node], right_list[node]))
+
+        return cls(
+            points=points[order],
+            labels=labels[order],
+            node_lo=np.array(lo_list, dtype=np.int64),
+            node_hi=np.array(hi_list, dtype=np.int64),
+            node_left=np.array(left_list, dtype=np.int32),
+            node_right=np.array(right_list, dtype=np.int32),
+            node_min=np.array(min_list, dtype=np.float32).reshape(-1, dim),
+            node_max=np.array(max_list, dtype=np.float32).reshape(-1, dim)
+        )
+
+    def _node_lists(self):
+        # The node arrays are small (about 2 * rows / leaf_size entries); the
+        # traversal reads them as Python lists, which is far cheaper per node
+        # than indexing numpy arrays. Points and labels stay as (mapped) arrays.
+        if self._nodes is None:
+            self._nodes = (
+                self.node_lo.tolist(),
+                self.node_hi.tolist(),
+                self.node_left.tolist(),
+                self.node_right.tolist(),
+                self.node_min.tolist(),
+                self.node_max.tolist()
+            )
+
+        return self._nodes
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        best_d: np.ndarray,
+        best_l: np.ndarray,
+        skip: np.ndarray = _NO_LABELS
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Merges this tree's neighbours into the sorted (best_d, best_l)
+        candidates, ignoring rows whose label is in the sorted array `skip`.
+        """
+        if not self.size:
+            return best_d, best_l
+
+        node_lo, node_hi, node_left, node_right, node_min, node_max = self._node_lists()
+        q = query.tolist()
+
+        def box_distance(node):
+            total = 0.0
+
+            for value, low, high in zip(q, node_min[node], node_max[node]):
+                if value < low:
+                    total += (low - value) ** 2
+                elif value > high:
+                    total += (value - high) ** 2
+
+            return total
+
+        heap = [(box_distance(0), 0)]
+        worst = float("inf")
+
+        while heap:
+            bound, node = heapq.heappop(heap)
+
+            if bound > worst:
+                break
+
+            left = node_left[node]
+
+            if left < 0:
+                lo, hi = node_lo[node], node_hi[node]
+                labels = self.labels[lo:hi]
+                diff = self.points[lo:hi] - query
+                dist = np.einsum("ij,ij->i", diff, diff)
+
+                if len(skip):
+                    keep = ~_contains(skip, labels)
+                    labels, dist = labels[keep], dist[keep]
+
+                best_d, best_l = _merge(best_d, best_l, dist, labels, k)
+
+                if len(best_d) == k:
+                    worst = float(best_d[-1])
+
+                continue
+
+            right = node_right[node]
+            heapq.heappush(heap, (box_distance(left), left))
+            heapq.heappush(heap, (box_distance(right), right))
+
+        return best_d, best_l
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+
+        for name in _TREE_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "KDTree":
+        mode = "r" if mmap else None
+        return cls(**{
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+            for name in _TREE_ARRAYS
+        })
+
+
+def _contains(sorted_labels: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    positions = np.minimum(np.searchsorted(sorted_labels, labels), len(sorted_labels) - 1)
+    return sorted_labels[positions] == labels
+
+
+def _merge(best_d, best_l, dist, labels, k):
+    dist = np.concatenate((best_d, dist.astype(np.float32, copy=False)))
+    labels = np.concatenate((best_l, labels))
+
+    if len(dist) > k:
+        keep = np.argpartition(dist, k - 1)[:k]
+        dist, labels = dist[keep], labels[keep]
+
+    order = np.argsort(dist, kind="stable")
+    return dist[order], labels[order]
+
+
+class SimilarityIndex:
+    """
+    One vector per label (e.g. per child). upsert() replaces a label's
+    vector; query() returns the k nearest labels with squared L2 distances.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        leaf_size: int = 64,
+        compact_threshold: int = 4096,
+        tree: Optional[KDTree] = None
+    ):
+        self.dim = dim
+        self.leaf_size = leaf_size
+        self.compact_threshold = compact_threshold
+
+        self._tree = tree or KDTree.build(np.empty((0, dim), np.float32), np.empty(0, np.int64), leaf_size)
+        self._delta_points = np.empty((0, dim), np.float32)
+        self._delta_labels = np.empty(0, np.int64)
+        self._delta_live = np.empty(0, bool)
+        self._delta_rows: Dict[int, int] = {}
+        self._delta_used = 0
+
+        # Labels whose tree row is outdated, and labels changed mid-compaction.
+        self._stale = _NO_LABELS
+        self._changed_during_compaction: Optional[set] = None
+
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+        self.compactions = 0
+
+        # Opaque position in the source data this index reflects; the owner
+        # sets it and save()/load() carry it in meta.json.
+        self.watermark: Optional[int] = None
+
+    @classmethod
+    def build(cls, dim: int, vectors, labels, **kwargs) -> "SimilarityIndex":
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, dim)
+        index = cls(dim, **kwargs)
+        index._tree = KDTree.build(vectors, labels, index.leaf_size)
+        return index
+
+    def upsert(self, label: int, vector: Sequence[float]):
+        vector = np.asarray(vector, dtype=np.float32)
+
+        if vector.shape != (self.dim,):
+            raise ValueError(f"Expected a vector of length {self.dim}")
+
+        with self._lock:
+            previous = self._delta_rows.get(label)
+
+            if previous is not None:
+                self._delta_live[previous] = False
+
+            if self._delta_used == len(self._delta_labels):
+                self._grow_delta()
+
+            row = self._delta_used
+            self._delta_points[row] = vector
+            self._delta_labels[row] = label
+            self._delta_live[row] = True
+            self._delta_rows[label] = row
+            self._delta_used += 1
+
+            position = int(np.searchsorted(self._stale, label))
+
+            if position == len(self._stale) or self._stale[position] != label:
+                # Copy-on-write, so queries can use the array without the lock.
+                self._stale = np.insert(self._stale, position, label)
+
+            if self._changed_during_compaction is not None:
+                self._changed_during_compaction.add(label)
+
+            should_compact = (
+                self._delta_used >= self.compact_threshold
+                and self._compactor is None
+            )
+
+            if should_compact:
+                self._compactor = threading.Thread(target=self.compact, name="similarity-compact", daemon=True)
+                self._compactor.start()
+
+    def query(self, vector: Sequence[float], k: int = 5, exclude: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (labels, squared distances) of the k nearest vectors, nearest first."""
+        query = np.asarray(vector, dtype=np.float32)
+
+        with self._lock:
+            tree = self._tree
+            stale = self._stale
+            used = self._delta_used
+            points = self._delta_points[:used]
+            labels = self._delta_labels[:used]
+            live = self._delta_live[:used].copy()
+
+        if exclude is not None:
+            stale = np.union1d(stale, [exclude])
+            live &= labels != exclude
+
+        best_d = np.empty(0, np.float32)
+        best_l = np.empty(0, np.int64)
+
+        if live.any():
+            diff = points[live] - query
+            best_d, best_l = _merge(best_d, best_l, np.einsum("ij,ij->i", diff, diff), labels[live], k)
+
+        best_d, best_l = tree.search(query, k, best_d, best_l, skip=stale)
+        return best_l, best_d
+
+    def compact(self):
+        """Rebuilds the tree from both segments; queries keep running meanwhile."""
+        with self._compact_lock:
+            self._compact()
+
+    def _compact(self):
+        with self._lock:
+            tree = self._tree
+            stale = self._stale
+            used = self._delta_used
+            live = self._delta_live[:used].copy()
+            delta_points = self._delta_points[:used][live]
+            delta_labels = self._delta_labels[:used][live]
+            self._changed_during_compaction = set()
+
+        try:
+            keep = ~np.isin(tree.labels, stale) if len(stale) else slice(None)
+            rebuilt = KDTree.build(
+                np.concatenate((tree.points[keep], delta_points)),
+                np.concatenate((tree.labels[keep], delta_labels)),
+                self.leaf_size
+            )
+
+            with self._lock:
+                changed = self._changed_during_compaction
+                rest = slice(used, self._delta_used)
+                rest_points = self._delta_points[rest].copy()
+                rest_labels = self._delta_labels[rest].copy()
+                rest_live = self._delta_live[rest].copy()
+
+                self._tree = rebuilt
+                self._delta_points = np.empty((max(len(rest_labels), 16), self.dim), np.float32)
+                self._delta_labels = np.empty(len(self._delta_points), np.int64)
+                self._delta_live = np.zeros(len(self._delta_points), bool)
+                self._delta_points[:len(rest_labels)] = rest_points
+                self._delta_labels[:len(rest_labels)] = rest_labels
+                self._delta_live[:len(rest_labels)] = rest_live
+                self._delta_used = len(rest_labels)
+                self._delta_rows = {
+                    int(label): row
+                    for row, label in enumerate(rest_labels)
+                    if rest_live[row]
+                }
+
+                # Anything upserted after the snapshot may also be in the new tree.
+                self._stale = np.array(sorted(changed), dtype=np.int64)
+                self.compactions += 1
+        finally:
+            with self._lock:
+                self._changed_during_compaction = None
+                self._compactor = None
+
+    def __len__(self) -> int:
+        """Number of labels in the index."""
+        with self._lock:
+            tree = self._tree
+            used = self._delta_used
+            delta = self._delta_labels[:used][self._delta_live[:used]]
+
+        return tree.size + int((~np.isin(delta, tree.labels)).sum())
+
+    def save(self, directory: str) -> bool:
+        """
+        Compacts, then writes the tree as .npy arrays in a new snapshot
+        directory and points meta.json at it. Returns False, without
+        writing, when another process is saving to `directory`.
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, "save.lock"), "w") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+
+            self.compact()
+
+            with self._lock:
+                tree = self._tree
+
+            snapshot = f"snapshot-{uuid.uuid4().hex}"
+            tree.save(os.path.join(directory, snapshot))
+
+            meta_path = os.path.join(directory, "meta.json")
+
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({
+                    "dim": self.dim,
+                    "leaf_size": self.leaf_size,
+                    "size": tree.size,
+                    "snapshot": snapshot,
+                    "watermark": self.watermark
+                }, f)
+
+            os.replace(meta_path + ".tmp", meta_path)
+
+            # Older snapshots may still be mapped elsewhere; unlinking keeps
+            # their pages alive until those maps close.
+            for name in os.listdir(directory):
+                if name.startswith("snapshot-") and name != snapshot:
+                    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+        return True
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, **kwargs) -> "SimilarityIndex":
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        kwargs.setdefault("leaf_size", meta["leaf_size"])
+        tree = KDTree.load(os.path.join(directory, meta.get("snapshot", "")), mmap=mmap)
+
+        index = cls(meta["dim"], tree=tree, **kwargs)
+        index.watermark = meta.get("watermark")
+        return index
+
+    def stats(self) -> dict:
+        with self._lock:
+            tree = self._tree
+
+            return {
+                "dim": self.dim,
+                "tree_rows": tree.size,
+                "delta_rows": self._delta_used,
+                "stale_labels": len(self._stale),
+                "tree_bytes": tree.nbytes,
+                "memory_mapped": isinstance(tree.points, np.memmap),
+                "compactions": self.compactions
+            }
+
+    def _grow_delta(self):
+        # Caller holds the lock.
+        size = max(16, 2 * len(self._delta_labels))
+        self._delta_points = np.resize(self._delta_points, (size, self.dim))
+        self._delta_labels = np.resize(self._delta_labels, size)
+        self._delta_live = np.resize(self._delta_live, size)
@@ -0,0 +1,394 @@
+# backend/benchmark.py
+#
+# Offline load/latency benchmark for the FastAPI app.
+#
+# Boots main.app in-process against a temporary SQLite file, seeds users and
+# scores, then drives each flow concurrently and writes a JSON report:
+#
+#     python benchmark.py --users 200 --scores 50 --requests 500 --concurrency 32
+#     python benchmark.py --output after.json --compare before.json
+#
+# Needs httpx (already pulled in by FastAPI's test client).
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+FLOWS = ["register", "login", "submit", "history", "quests", "agent_summary", "chat"]
+
+CHAT_MESSAGES = [
+    "why do I mix up b and d",
+    "how do I read ship",
+    "what sound does ph make",
+    "cat",
+    "syllables are hard"
+]
+
+TEST_TYPES = ["Phoneme Popper Game", "Star Tracker", "Letter Mirror"]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class SQLCounter:
+    """Counts statements on every engine the app uses."""
+
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.statements = 0
+
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.statements += 1
+
+
+def seed(app_module, users, scores_per_user, password):
+    """Bulk-loads users and scores through the sync engine."""
+    from sqlalchemy import insert, select
+
+    from database import SessionLocal
+    from models import DBScore, DBUser
+    from password_hashing import hash_password
+    from summary import rebuild_summaries
+
+    hashed = hash_password(password, app_module.hashing_pool.rounds)
+    start = datetime.utcnow() - timedelta(days=scores_per_user)
+    rng = random.Random(42)
+
+    with SessionLocal() as db:
+        db.execute(insert(DBUser), [
+            {
+                "email": f"seed{i}@bench.local",
+                "hashed_password": hashed,
+                "first_name": f"Seed{i}",
+                "age": 7,
+                "role": "child"
+            }
+            for i in range(users)
+        ])
+
+        user_ids = db.execute(select(DBUser.id)).scalars().all()
+        batch = []
+
+        for user_id in user_ids:
+            for n in range(scores_per_user):
+                accuracy = rng.uniform(20, 100)
+                batch.append({
+                    "user_id": user_id,
+                    "test_type": rng.choice(TEST_TYPES),
+                    "accuracy_percent": accuracy,
+                    "risk_level": app_module.risk_level_for(accuracy),
+                    "created_at": start + timedelta(days=n)
+                })
+
+                if len(batch) >= 5000:
+                    db.execute(insert(DBScore), batch)
+                    batch = []
+
+        if batch:
+            db.execute(insert(DBScore), batch)
+
+        db.commit()
+
+    rebuild_summaries()
+    return user_ids
+
+
+def make_tokens(app_module, users):
+    import jwt
+
+    exp = datetime.utcnow() + timedelta(hours=1)
+
+    return [
+        jwt.encode(
+            {"sub": f"seed{i}@bench.local", "exp": exp},
+            app_module.JWT_SECRET,
+            algorithm=app_module.ALGORITHM
+        )
+        for i in range(users)
+    ]
+
+
+def flow_request(flow, i, tokens, password):
+    """Returns (method, url, kwargs) for the i-th request of a flow."""
+    auth = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+    if flow == "register":
+        return "POST", "/auth/register", {"json": {
+            "email": f"new{i}@bench.local",
+            "password": password,
+            "first_name": "New",
+            "age": 7
+        }}
+
+    if flow == "login":
+        return "POST", "/auth/token", {"data": {
+            "username": f"seed{i % len(tokens)}@bench.local",
+            "password": password
+        }}
+
+    if flow == "submit":
+        return "POST", "/api/assessment/submit", {"headers": auth, "json": {
+            "test_type": TEST_TYPES[i % len(TEST_TYPES)],
+            "accuracy_percent": float(i % 100)
+        }}
+
+    if flow == "history":
+        return "GET", "/api/assessment/history", {"headers": auth}
+
+    if flow == "quests":
+        return "GET", "/api/quests", {"headers": auth}
+
+    if flow == "agent_summary":
+        return "GET", "/api/agent/summary", {"headers": auth}
+
+    if flow == "chat":
+        return "POST", "/api/chat/gemini", {
+            "headers": {"Accept": "text/event-stream", "Content-Type": "application/json"},
+            "json": {"message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]}
+        }
+
+    raise ValueError(f"Unknown flow {flow}")
+
+
+async def asgi_request(app, method, url, headers, body):
+    """
+    Calls the app directly at the ASGI boundary, so the first body chunk of
+    a streamed response can be timed. Returns (status, ttfb_ms, total_ms).
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": url,
+        "raw_path": url.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("bench", 0),
+        "server": ("bench", 80)
+    }
+    state = {"status": 0, "first": None, "sent": False}
+
+    async def receive():
+        if not state["sent"]:
+            state["sent"] = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        # Never disconnect; the app cancels this once the response is done.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+
+        elif message["type"] == "http.response.body" and message.get("body") and state["first"] is None:
+            state["first"] = time.perf_counter()
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    finished = time.perf_counter()
+
+    return state["status"], ((state["first"] or finished) - started) * 1000, (finished - started) * 1000
+
+
+async def run_flow(client, counter, flow, requests, concurrency, tokens, password):
+    latencies = []
+    ttfbs = []
+    statuses = {}
+    next_index = iter(range(requests))
+
+    async def worker():
+        for i in next_index:
+            method, url, kwargs = flow_request(flow, i, tokens, password)
+
+            if flow == "chat":
+                status, ttfb, total = await asgi_request(
+                    client._transport.app,
+                    method,
+                    url,
+                    kwargs["headers"],
+                    json.dumps(kwargs["json"]).encode()
+                )
+                ttfbs.append(ttfb)
+                latencies.append(total)
+                statuses[status] = statuses.get(status, 0) + 1
+                continue
+
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    statements_before = counter.statements
+    started = time.perf_counter()
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    ttfbs.sort()
+
+    result = {
+        "requests": requests,
+        "errors": sum(count for code, count in statuses.items() if code >= 400),
+        "status_counts": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "sql_per_request": (counter.statements - statements_before) / requests
+    }
+
+    if ttfbs:
+        result.update({
+            "ttfb_p50_ms": percentile(ttfbs, 0.50),
+            "ttfb_p95_ms": percentile(ttfbs, 0.95),
+            "ttfb_p99_ms": percentile(ttfbs, 0.99)
+        })
+
+    return result
+
+
+async def run(args):
+    import httpx
+
+    import main as app_module
+    from database import async_engine, engine, writer_engine
+
+    counter = SQLCounter([engine, async_engine.sync_engine, writer_engine.sync_engine])
+
+    seed_started = time.perf_counter()
+    seed(app_module, args.users, args.scores, args.password)
+    seed_seconds = time.perf_counter() - seed_started
+
+    tokens = make_tokens(app_module, args.users)
+    results = {}
+
+    async with app_module.app.router.lifespan_context(app_module.app):
+        transport = httpx.ASGITransport(app=app_module.app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for flow in args.flows:
+                results[flow] = await run_flow(
+                    client,
+                    counter,
+                    flow,
+                    args.requests,
+                    args.concurrency,
+                    tokens,
+                    args.password
+                )
+                print(
+                    f"{flow:<14} {results[flow]['throughput_rps']:9.1f} req/s  "
+                    f"p50 {results[flow]['p50_ms']:7.2f} ms  "
+                    f"p95 {results[flow]['p95_ms']:7.2f} ms  "
+                    f"p99 {results[flow]['p99_ms']:7.2f} ms  "
+                    f"sql/req {results[flow]['sql_per_request']:5.2f}  "
+                    f"errors {results[flow]['errors']}"
+                    + (f"  ttfb p95 {results[flow]['ttfb_p95_ms']:.2f} ms" if "ttfb_p95_ms" in results[flow] else "")
+                )
+
+    return {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "users": args.users,
+            "scores_per_user": args.scores,
+            "requests_per_flow": args.requests,
+            "concurrency": args.concurrency,
+            "hash_rounds": app_module.hashing_pool.rounds,
+            "seed_seconds": seed_seconds
+        },
+        "flows": results
+    }
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('git_revision')})")
+
+    for flow, current in report["flows"].items():
+        previous = baseline["flows"].get(flow)
+
+        if not previous:
+            continue
+
+        deltas = []
+
+        for key in ["throughput_rps", "p50_ms", "p95_ms", "p99_ms", "sql_per_request"]:
+            before, after = previous[key], current[key]
+            change = (after - before) / before * 100 if before else 0.0
+            deltas.append(f"{key} {change:+6.1f}%")
+
+        print(f"{flow:<14} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DyslexiCore API benchmark")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--scores", type=int, default=50, help="scores seeded per user")
+    parser.add_argument("--requests", type=int, default=300, help="requests per flow")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--flows", nargs="+", choices=FLOWS, default=FLOWS)
+    parser.add_argument("--hash-rounds", type=int, default=5000,
+                        help="password hash cost used while benchmarking")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="previous report to diff against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="dyslexicore-bench-") as tmp:
+        # Must be set before the app (and its engines) are imported.
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["HASH_ROUNDS"] = str(args.hash_rounds)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+        report = asyncio.run(run(args))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
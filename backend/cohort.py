@@ -0,0 +1,125 @@
+# backend/cohort.py
+#
+# Classroom / cohort screening analytics.
+#
+# A cohort is either a class roster (models.DBClassMember) or an explicit list
+# of user ids. Whatever its size, a report costs two aggregate queries:
+#
+# - one row per child from users + user_summaries, which gives the risk
+#   distribution and the at-risk list
+# - one GROUP BY (user_id, test_type) over scores, giving each child's mean
+#   accuracy per test type; numpy turns those columns into per-test-type
+#   percentiles across the cohort
+
+import os
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import DBClassMember, DBScore, DBUser, DBUserSummary
+
+COHORT_PERCENTILES = (10, 25, 50, 75, 90)
+
+MAX_COHORT_SIZE = int(os.getenv("MAX_COHORT_SIZE", "10000"))
+
+# Summary risk level that puts a child on the at-risk list.
+AT_RISK_LEVEL = "High"
+
+
+def cohort_members(class_id: Optional[str] = None, user_ids: Optional[List[int]] = None) -> Select:
+    """Select of the cohort's user ids, for use inside IN (...)."""
+    if class_id is not None:
+        return select(DBClassMember.user_id).where(DBClassMember.class_id == class_id)
+
+    return select(DBUser.id).where(DBUser.id.in_(user_ids or []))
+
+
+def test_type_percentiles(test_types: List[Optional[str]], accuracies: List[float]) -> dict:
+    """Percentiles of per-child mean accuracy, grouped by test type."""
+    if not test_types:
+        return {}
+
+    names, codes = np.unique(
+        np.array([name or "Unknown" for name in test_types]),
+        return_inverse=True
+    )
+    values = np.asarray(accuracies, dtype=np.float64)
+
+    # Sort by (test type, accuracy) once; each type is then a contiguous run.
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+    bounds = np.searchsorted(codes, np.arange(len(names) + 1))
+
+    report = {}
+
+    for code, name in enumerate(names.tolist()):
+        run = values[bounds[code]:bounds[code + 1]]
+        quantiles = np.percentile(run, COHORT_PERCENTILES)
+
+        report[name] = {
+            "children": int(len(run)),
+            "mean": float(run.mean()),
+            **{f"p{p}": float(q) for p, q in zip(COHORT_PERCENTILES, quantiles)}
+        }
+
+    return report
+
+
+async def cohort_analytics(db: AsyncSession, members: Select, at_risk_limit: int = 100) -> dict:
+
+    children = (await db.execute(
+        select(
+            DBUser.id,
+            DBUser.first_name,
+            DBUserSummary.session_count,
+            DBUserSummary.latest_test_type,
+            DBUserSummary.latest_accuracy,
+            DBUserSummary.latest_risk_level,
+            DBUserSummary.latest_at,
+            DBUserSummary.accuracy_trend
+        )
+        .outerjoin(DBUserSummary, DBUserSummary.user_id == DBUser.id)
+        .where(DBUser.id.in_(members))
+    )).all()
+
+    per_child = (await db.execute(
+        select(DBScore.test_type, func.avg(DBScore.accuracy_percent))
+        .where(DBScore.user_id.in_(members))
+        .group_by(DBScore.user_id, DBScore.test_type)
+    )).all()
+
+    risk_distribution = Counter(
+        child.latest_risk_level or "Unscreened"
+        for child in children
+    )
+
+    at_risk = sorted(
+        (child for child in children if child.latest_risk_level == AT_RISK_LEVEL),
+        key=lambda child: (child.latest_accuracy is None, child.latest_accuracy or 0.0, child.id)
+    )
+
+    return {
+        "cohort_size": len(children),
+        "screened": len(children) - risk_distribution.get("Unscreened", 0),
+        "risk_distribution": dict(risk_distribution),
+        "test_types": test_type_percentiles(
+            [test_type for test_type, _ in per_child],
+            [accuracy or 0.0 for _, accuracy in per_child]
+        ),
+        "at_risk_count": len(at_risk),
+        "at_risk": [
+            {
+                "user_id": child.id,
+                "first_name": child.first_name,
+                "sessions": child.session_count,
+                "latest_test_type": child.latest_test_type,
+                "latest_accuracy": child.latest_accuracy,
+                "latest_at": child.latest_at,
+                "accuracy_trend": child.accuracy_trend
+            }
+            for child in at_risk[:at_risk_limit]
+        ]
+    }
@@ -1,17 +1,304 @@
-from sqlalchemy import create_all, create_engine
+# backend/database.py
+#
+# Storage layer: the one place that builds the SQLite engines.
+#
+# - routes use the async engine (aiosqlite), so DB waits never block the
+#   event loop or borrow threadpool threads
+# - the sync engine is kept for schema setup and offline tools
+# - WAL journal so readers never wait on the writer
+# - synchronous=NORMAL, which is durable under WAL except on power loss
+# - a single writer task that group-commits queued writes, so concurrent
+#   submissions share one transaction instead of fighting over the lock
+
+import asyncio
+import contextvars
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite:///./dyslexia_app.db"
+)
+
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace(
+    "sqlite://",
+    "sqlite+aiosqlite://",
+    1
+)
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "16384"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "16"))
+
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "256"))
+WRITE_QUEUE_LINGER_MS = float(os.getenv("WRITE_QUEUE_LINGER_MS", "2"))
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={
+        "check_same_thread": False,
+        "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000
+    },
+    poolclass=QueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW
+)
+
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW
+)
+
+# The writer gets its own connection so it can never be starved by readers
+# holding every pooled connection while they wait on a queued write.
+writer_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    pool_size=1,
+    max_overflow=0
+)
+
+
+@event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
+@event.listens_for(writer_engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    # Negative cache_size is in KiB rather than pages.
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./dyslexia_app.db"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+WriterSessionLocal = sessionmaker(
+    writer_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 Base = declarative_base()
 
+
+def init_db() -> set:
+    """
+    Creates missing tables, plus any indexes added to existing tables.
+
+    Returns the names of the tables that had to be created.
+    """
+    import models  # noqa: F401  (registers the tables on Base.metadata)
+
+    existing = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+
+    # create_all skips tables that already exist, so indexes added to
+    # existing models have to be created explicitly.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    return set(Base.metadata.tables) - existing
+
+
+async def close_db():
+    await write_queue.stop()
+    await async_engine.dispose()
+    await writer_engine.dispose()
+
+
 # Dependency to get a DB session in your routes
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+# -----------------------
+# Single-writer group commit
+# -----------------------
+
+WriteJob = Callable[[AsyncSession], Awaitable[Any]]
+
+_STOP = object()
+
+
+class WriteQueue:
+    """
+    Serializes writes through one asyncio task.
+
+    The writer takes the first queued job, waits up to `linger_ms` for more
+    (up to `max_batch`), awaits them all on one session and commits once. If
+    the shared transaction fails, the jobs are retried one transaction each
+    so a bad job only fails its own caller.
+    """
+
+    def __init__(
+        self,
+        session_factory=WriterSessionLocal,
+        max_batch: int = WRITE_QUEUE_MAX_BATCH,
+        linger_ms: float = WRITE_QUEUE_LINGER_MS
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max(1, max_batch)
+        self.linger = linger_ms / 1000
+
+        self._queue = None
+        self._task = None
+
+        self.jobs = 0
+        self.commits = 0
+        self.largest_batch = 0
+
+    async def run(self, job: WriteJob) -> Any:
+        """Queues `await job(session)` and returns its result after commit."""
+        self._ensure_started()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((job, future))
+        return await future
+
+    async def stop(self):
+        task, self._task = self._task, None
+
+        if task is not None and not task.done():
+            self._queue.put_nowait(_STOP)
+            await task
+
+    def stats(self) -> dict:
+        return {
+            "jobs": self.jobs,
+            "commits": self.commits,
+            "mean_batch": self.jobs / self.commits if self.commits else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
+
+    def _ensure_started(self):
+        # (Re)start on the running loop; test clients may run several loops.
+        loop = asyncio.get_running_loop()
+
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            # Start from an empty context: the writer outlives the request
+            # that happened to start it and must not inherit its contextvars.
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+
+    async def _run(self):
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.linger
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+
+                try:
+                    if remaining > 0:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    else:
+                        item = self._queue.get_nowait()
+
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+
+                batch.append(item)
+
+            try:
+                await self._commit(batch)
+
+            except Exception as exc:
+                # e.g. no connection could be opened; fail the batch, keep going
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    async def _commit(self, batch):
+        batch = [(job, future) for job, future in batch if not future.done()]
+
+        if not batch:
+            return
+
+        async with self.session_factory() as session:
+
+            try:
+                try:
+                    results = [await job(session) for job, _ in batch]
+                    await session.commit()
+
+                except Exception:
+                    await session.rollback()
+
+                    if len(batch) == 1:
+                        raise
+
+                    for job, future in batch:
+                        await self._commit_one(session, job, future)
+
+                    return
+
+                self._record(len(batch))
+
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    async def _commit_one(self, session, job, future):
+        try:
+            result = await job(session)
+            await session.commit()
+
+        except Exception as exc:
+            await session.rollback()
+
+            if not future.done():
+                future.set_exception(exc)
+            return
+
+        self._record(1)
+
+        if not future.done():
+            future.set_result(result)
+
+    def _record(self, size: int):
+        self.jobs += size
+        self.commits += 1
+        self.largest_batch = max(self.largest_batch, size)
+
+
+write_queue = WriteQueue()
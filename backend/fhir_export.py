@@ -0,0 +1,384 @@
+# backend/fhir_export.py
+#
+# FHIR Bulk Data style $export: every child as a Patient, every score as an
+# Observation, written to gzip NDJSON files by a background job.
+#
+# Each resource type is read through one streaming cursor in FHIR_EXPORT_BATCH
+# row partitions. Every partition is serialized and pushed into a gzip stream,
+# so memory use is flat however large the population is.
+#
+# `_since` makes the export incremental. Observations are filtered on
+# created_at. Patients are filtered on their summary's updated_at, which moves
+# on every new score; users have no timestamp of their own, so children with
+# no scores yet are in every incremental export until their first score.
+#
+# Both timestamps are stamped before the write queue commits the row, so a
+# row can become visible some time after its timestamp. A job's transaction
+# time is therefore FHIR_EXPORT_SAFETY_SECONDS before the job starts, and only
+# rows stamped before it are exported. As long as no write takes longer than
+# that margin to commit, the next export can pass the transaction time as
+# `_since` and gets no gaps and no duplicates.
+
+import gzip
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import and_, func, or_, select
+
+from database import engine
+from models import DBScore, DBUser, DBUserSummary
+from response_cache import dumps
+
+FHIR_EXPORT_DIR = os.getenv("FHIR_EXPORT_DIR", "fhir_exports")
+FHIR_EXPORT_BATCH = int(os.getenv("FHIR_EXPORT_BATCH", "1000"))
+FHIR_EXPORT_MAX_JOBS = int(os.getenv("FHIR_EXPORT_MAX_JOBS", "2"))
+FHIR_EXPORT_TTL_SECONDS = float(os.getenv("FHIR_EXPORT_TTL_SECONDS", "3600"))
+FHIR_EXPORT_GZIP_LEVEL = int(os.getenv("FHIR_EXPORT_GZIP_LEVEL", "6"))
+FHIR_EXPORT_SAFETY_SECONDS = float(os.getenv("FHIR_EXPORT_SAFETY_SECONDS", "60"))
+
+EXPORT_TYPES = ("Patient", "Observation")
+
+PATIENT_ROLE = "child"
+
+RISK_CONTEXT_URL = "https://dyslexicore.ai/fhir/StructureDefinition/learning-risk-context"
+
+
+def patient_resource(user_id: int, first_name: Optional[str]) -> dict:
+    return {
+        "resourceType": "Patient",
+        "id": f"child-{user_id}",
+        "name": [
+            {
+                "given": [first_name]
+            }
+        ],
+        "extension": [
+            {
+                "url": RISK_CONTEXT_URL,
+                "valueString": "Dyslexia screening candidate"
+            }
+        ]
+    }
+
+
+def observation_resource(
+    score_id: int,
+    user_id: int,
+    test_type: Optional[str],
+    accuracy_percent: Optional[float],
+    risk_level: Optional[str],
+    created_at: Optional[datetime]
+) -> dict:
+    resource = {
+        "resourceType": "Observation",
+        "id": f"score-{score_id}",
+        "status": "final",
+        "category": [
+            {
+                "coding": [
+                    {
+                        "system": "http://terminology.hl7.org/CodeSystem/observation-category",
+                        "code": "survey"
+                    }
+                ]
+            }
+        ],
+        "code": {"text": test_type},
+        "subject": {"reference": f"Patient/child-{user_id}"},
+        "valueQuantity": {
+            "value": accuracy_percent,
+            "unit": "%",
+            "system": "http://unitsofmeasure.org",
+            "code": "%"
+        }
+    }
+
+    if created_at is not None:
+        resource["effectiveDateTime"] = created_at.isoformat() + "Z"
+
+    if risk_level:
+        resource["interpretation"] = [{"text": risk_level}]
+
+    return resource
+
+
+def parse_instant(value: str) -> datetime:
+    """FHIR instant -> naive UTC datetime, to compare with the stored timestamps."""
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+
+    except ValueError:
+        raise ValueError("_since must be an ISO 8601 instant, e.g. 2026-01-01T00:00:00Z")
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return parsed
+
+
+def parse_types(value: Optional[str]) -> tuple:
+    if not value:
+        return EXPORT_TYPES
+
+    types = tuple(dict.fromkeys(t.strip() for t in value.split(",") if t.strip()))
+    unknown = [t for t in types if t not in EXPORT_TYPES]
+
+    if unknown or not types:
+        raise ValueError(f"_type must be a subset of {', '.join(EXPORT_TYPES)}")
+
+    return types
+
+
+def _patient_query(since: Optional[datetime], until: datetime):
+    query = select(DBUser.id, DBUser.first_name).where(DBUser.role == PATIENT_ROLE)
+
+    if since is not None:
+        query = query.outerjoin(DBUserSummary, DBUserSummary.user_id == DBUser.id).where(
+            or_(
+                DBUserSummary.user_id.is_(None),
+                and_(
+                    DBUserSummary.updated_at >= since,
+                    DBUserSummary.updated_at < until
+                )
+            )
+        )
+
+    return query.order_by(DBUser.id)
+
+
+def _observation_query(since: Optional[datetime], until: datetime):
+    query = select(
+        DBScore.id,
+        DBScore.user_id,
+        DBScore.test_type,
+        DBScore.accuracy_percent,
+        DBScore.risk_level,
+        DBScore.created_at
+    ).where(DBScore.created_at < until)
+
+    if since is not None:
+        query = query.where(DBScore.created_at >= since)
+
+    return query.order_by(DBScore.id)
+
+
+QUERIES = {
+    "Patient": (_patient_query, lambda row: patient_resource(*row)),
+    "Observation": (_observation_query, lambda row: observation_resource(*row))
+}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+@dataclass
+class ExportJob:
+    id: str
+    owner_id: int
+    request_url: str
+    since: Optional[datetime]
+    types: tuple
+    transaction_time: datetime
+
+    status: str = "in-progress"
+    error: Optional[str] = None
+    cancelled: bool = False
+    started: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    totals: Dict[str, int] = field(default_factory=dict)
+    written: Dict[str, int] = field(default_factory=dict)
+    files: Dict[str, str] = field(default_factory=dict)
+
+    def progress(self) -> str:
+        total = sum(self.totals.values())
+        done = sum(self.written.values())
+        percent = 100 * done // total if total else 0
+        return f"{percent}% ({done}/{total} resources)"
+
+    def manifest(self, file_url) -> dict:
+        """Bulk Data completion manifest; `file_url(job, file_name)` builds links."""
+        return {
+            "transactionTime": self.transaction_time.isoformat() + "Z",
+            "request": self.request_url,
+            "requiresAccessToken": True,
+            "output": [
+                {
+                    "type": resource_type,
+                    "url": file_url(self, os.path.basename(path)),
+                    "count": self.written.get(resource_type, 0)
+                }
+                for resource_type, path in self.files.items()
+            ],
+            "error": []
+        }
+
+
+class ExportManager:
+
+    def __init__(
+        self,
+        root: str = FHIR_EXPORT_DIR,
+        max_jobs: int = FHIR_EXPORT_MAX_JOBS,
+        ttl_seconds: float = FHIR_EXPORT_TTL_SECONDS,
+        batch_size: int = FHIR_EXPORT_BATCH
+    ):
+        self.root = root
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+
+    def start(self, owner_id: int, request_url: str, since: Optional[datetime], types: tuple) -> Optional[ExportJob]:
+        """Starts a job in a background thread; None when max_jobs are already running."""
+        self.expire()
+
+        with self._lock:
+            running = sum(job.status == "in-progress" for job in self._jobs.values())
+
+            if running >= self.max_jobs:
+                return None
+
+            job = ExportJob(
+                id=uuid.uuid4().hex,
+                owner_id=owner_id,
+                request_url=request_url,
+                since=since,
+                types=types,
+                transaction_time=datetime.utcnow() - timedelta(seconds=FHIR_EXPORT_SAFETY_SECONDS)
+            )
+            self._jobs[job.id] = job
+
+        threading.Thread(target=self._run, args=(job,), name=f"fhir-export-{job.id[:8]}", daemon=True).start()
+
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def delete(self, job_id: str) -> bool:
+        """Cancels a running job, or removes a finished one and its files."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+
+        if job is None:
+            return False
+
+        job.cancelled = True
+
+        if job.status != "in-progress":
+            shutil.rmtree(self.job_dir(job), ignore_errors=True)
+
+        return True
+
+    def file_path(self, job: ExportJob, file_name: str) -> Optional[str]:
+        for path in job.files.values():
+            if os.path.basename(path) == file_name:
+                return path
+
+        return None
+
+    def job_dir(self, job: ExportJob) -> str:
+        return os.path.join(self.root, job.id)
+
+    def expire(self):
+        now = time.time()
+
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished is not None and now - job.finished > self.ttl_seconds
+            ]
+
+        for job_id in expired:
+            self.delete(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+
+        return {
+            "jobs": len(jobs),
+            "running": sum(job.status == "in-progress" for job in jobs),
+            "max_jobs": self.max_jobs,
+            "batch_size": self.batch_size
+        }
+
+    # --- JOB ---
+
+    def _run(self, job: ExportJob):
+        directory = self.job_dir(job)
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+
+            with engine.connect() as conn:
+                for resource_type in job.types:
+                    build_query, _ = QUERIES[resource_type]
+                    query = build_query(job.since, job.transaction_time)
+
+                    job.totals[resource_type] = conn.execute(
+                        select(func.count()).select_from(query.order_by(None).subquery())
+                    ).scalar_one()
+
+                for resource_type in job.types:
+                    self._export_type(conn, job, resource_type, directory)
+
+            job.status = "completed"
+
+        except ExportCancelled:
+            job.status = "cancelled"
+
+        except Exception as exc:
+            job.status = "error"
+            job.error = str(exc)
+
+        finally:
+            job.finished = time.time()
+
+            # A job deleted while running cleans up after itself.
+            if job.cancelled or job.status == "error":
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def _export_type(self, conn, job: ExportJob, resource_type: str, directory: str):
+        build_query, to_resource = QUERIES[resource_type]
+        path = os.path.join(directory, f"{resource_type}.ndjson.gz")
+        job.written[resource_type] = 0
+
+        result = conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(
+            build_query(job.since, job.transaction_time)
+        )
+
+        with gzip.open(path + ".part", "wb", compresslevel=FHIR_EXPORT_GZIP_LEVEL) as out:
+            for rows in result.partitions():
+                if job.cancelled:
+                    result.close()
+                    raise ExportCancelled()
+
+                out.write(b"".join(dumps(to_resource(row)) + b"\n" for row in rows))
+                job.written[resource_type] += len(rows)
+
+        os.replace(path + ".part", path)
+        job.files[resource_type] = path
+
+
+if __name__ == "__main__":
+    manager = ExportManager()
+    started = time.perf_counter()
+    job = manager.start(0, "$export", None, EXPORT_TYPES)
+
+    while job.status == "in-progress":
+        time.sleep(0.2)
+        print(job.progress())
+
+    print(f"{job.status} in {time.perf_counter() - started:.2f}s: {job.written} -> {manager.job_dir(job)}")
@@ -1,86 +1,123 @@
 import os
+import sys
+import json
+import base64
+import asyncio
+from bisect import bisect_right
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import List, Optional
 
 import jwt
-from passlib.context import CryptContext
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey, DateTime
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
-
-# --- DATABASE CONFIGURATION ---
-SQLALCHEMY_DATABASE_URL = "sqlite:///./dyslexia_app.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import delete, event, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import (
+    AsyncSessionLocal,
+    SessionLocal,
+    async_engine,
+    close_db,
+    engine,
+    get_db,
+    init_db,
+    write_queue,
+    writer_engine
 )
-
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine
+from models import DBUser, DBScore, DBQuestProgress, DBUserSummary, DBClassMember
+
+from password_hashing import HashingPool, HashingPoolSaturated
+from principal_cache import Principal, PrincipalCache
+from cohort import MAX_COHORT_SIZE, cohort_analytics, cohort_members
+from fhir_export import ExportManager, parse_instant, parse_types, patient_resource
+from metrics import Metrics, MetricsMiddleware
+from quest_catalog import QuestCatalog
+from response_cache import CachedPayload, FastJSONResponse, ResponseCache, dumps
+from summary import rebuild_summaries, record_scores, summary_payload
+from tutor import TutorEngine
+from telemetry import (
+    EVENT_DTYPE,
+    TELEMETRY_MAX_CHUNK,
+    TelemetryStore,
+    check_session_id,
+    events_from_bytes,
+    events_from_columns
 )
 
-Base = declarative_base()
-
-# --- DATABASE MODELS ---
-
-class DBUser(Base):
-    __tablename__ = "users"
-
-    id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
-    first_name = Column(String)
-    age = Column(Integer)
-    role = Column(String, default="child")
+# ai_core/ sits next to backend/; make it importable when run from backend/.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_core.service_interface import (
+    SUBTYPE_TEST_TYPES,
+    model_registry,
+    open_subtype_index,
+    recommendation_cache,
+    refresh_subtype_index,
+    save_subtype_index,
+    subtype_vector
+)
 
-    scores = relationship("DBScore", back_populates="owner")
-    quest_progress = relationship("DBQuestProgress", back_populates="owner")
+# --- DATABASE ---
 
+if DBUserSummary.__tablename__ in init_db():
+    # First start with the summary table: backfill it from existing scores.
+    rebuild_summaries()
 
-class DBScore(Base):
-    __tablename__ = "scores"
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+def load_subtype_vectors(since: Optional[int] = None):
+    """
+    Subtype vectors of children scored after score id `since` (all children
+    when None) and the score-id watermark they reflect. Ids are handed out by
+    the single writer in commit order, so nothing committed later can have a
+    smaller one.
+    """
 
-    test_type = Column(String)
-    accuracy_percent = Column(Float)
-    risk_level = Column(String)
+    with SessionLocal() as db:
+        # Read first: summaries read afterwards are at least this new.
+        watermark = db.scalar(select(func.max(DBScore.id))) or 0
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+        query = select(
+            DBUserSummary.user_id,
+            DBUserSummary.best_by_test_type,
+            DBUserSummary.accuracy_mean
+        )
 
-    owner = relationship("DBUser", back_populates="scores")
+        if since is not None:
+            query = query.where(
+                DBUserSummary.user_id.in_(
+                    select(DBScore.user_id).where(DBScore.id > since).distinct()
+                )
+            )
 
+        rows = db.execute(query).all()
 
-class DBQuestProgress(Base):
-    __tablename__ = "quest_progress"
+    return (
+        [user_id for user_id, _, _ in rows],
+        [subtype_vector(bests, mean or 0.0) for _, bests, mean in rows],
+        watermark
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
 
-    module_name = Column(String)
-    progress_percent = Column(Float, default=0.0)
-    is_mastered = Column(Boolean, default=False)
+def count_subtype_children() -> int:
 
-    owner = relationship("DBUser", back_populates="quest_progress")
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(DBUserSummary))
 
 
-# --- CREATE DATABASE TABLES ---
-Base.metadata.create_all(bind=engine)
+# Nearest-neighbour index of children's subtype vectors; submits upsert it
+# and lookups first replay scores other workers wrote.
+subtype_index = open_subtype_index(load_subtype_vectors, count_subtype_children)
 
 # --- SECURITY CONFIG ---
 
-PWD_CONTEXT = CryptContext(
-    schemes=["sha256_crypt"],
-    deprecated="auto"
-)
+hashing_pool = HashingPool()
 
 JWT_SECRET = os.getenv(
     "JWT_SECRET",
@@ -93,10 +130,78 @@ oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="auth/token"
 )
 
+quest_catalog = QuestCatalog.load()
+
+tutor = TutorEngine.load()
+
+principal_cache = PrincipalCache(
+    max_entries=int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+)
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "4096"))
+)
+
+telemetry_store = TelemetryStore()
+
+fhir_exports = ExportManager()
+
+metrics = Metrics()
+metrics.instrument(engine, async_engine.sync_engine, writer_engine.sync_engine)
+
+
+@event.listens_for(DBUser, "after_update")
+@event.listens_for(DBUser, "after_delete")
+def _invalidate_cached_principal(mapper, connection, target):
+
+    principal_cache.invalidate_user(target.id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_touched_users(session, flush_context):
+
+    touched = session.info.setdefault("touched_users", set())
+
+    for obj in (*session.new, *session.dirty, *session.deleted):
+
+        if isinstance(obj, DBUser):
+            touched.add(obj.id)
+
+        elif getattr(obj, "user_id", None) is not None:
+            touched.add(obj.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_touched_users(session):
+
+    # Only after commit, so a concurrent reader cannot re-cache old rows.
+    for user_id in session.info.pop("touched_users", ()):
+        response_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched_users(session):
+
+    session.info.pop("touched_users", None)
+
 # --- FASTAPI APP ---
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+
+    yield
+
+    await close_db()
+    hashing_pool.shutdown()
+    save_subtype_index(subtype_index, load_subtype_vectors)
+
+
 app = FastAPI(
-    title="DyslexiCore Healthcare AI Agent"
+    title="DyslexiCore Healthcare AI Agent",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # --- CORS ---
@@ -110,26 +215,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# --- DATABASE DEPENDENCY ---
+# --- METRICS ---
 
-def get_db():
-    db = SessionLocal()
+# Added last, so it is outermost and times the whole stack.
+app.add_middleware(MetricsMiddleware, metrics=metrics)
 
-    try:
-        yield db
+# --- RESPONSE CACHE ---
+
+async def cached_for_user(request: Request, user_id: int, key: str, build):
+    """
+    Serves a per-user payload from the response cache, building it with
+    `await build()` on a miss. Answers 304 when If-None-Match matches.
+    """
+
+    payload = response_cache.get(user_id, key)
 
-    finally:
-        db.close()
+    if payload is None:
+        generation = response_cache.generation(user_id)
+
+        payload = CachedPayload.from_content(
+            jsonable_encoder(await build()),
+            cache_control="private, no-cache"
+        )
+
+        response_cache.put(user_id, key, payload, generation)
+
+    return payload.respond(request)
 
 # --- AUTH DEPENDENCY ---
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme)
 ):
 
+    cached = principal_cache.get(token)
+
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(
             token,
@@ -145,9 +271,12 @@ async def get_current_user(
             detail="Invalid session"
         )
 
-    user = db.query(DBUser).filter(
-        DBUser.email == email
-    ).first()
+    # A short-lived session, so the connection is back in the pool before
+    # the route runs (and before it waits on any queued write).
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(
+            select(DBUser).where(DBUser.email == email)
+        )).scalars().first()
 
     if not user:
         raise HTTPException(
@@ -155,7 +284,47 @@ async def get_current_user(
             detail="User not found"
         )
 
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.put(token, principal, payload.get("exp"))
+
+    return principal
+
+
+# Roles allowed to read classroom-wide data.
+STAFF_ROLES = set(os.getenv("STAFF_ROLES", "teacher,clinician,admin").split(","))
+
+
+async def get_staff_user(
+    current_user: Principal = Depends(get_current_user)
+):
+
+    if current_user.role not in STAFF_ROLES:
+        raise HTTPException(
+            status_code=403,
+            detail="Staff account required"
+        )
+
+    return current_user
+
+# --- PASSWORD HASHING ---
+
+async def run_hashing(submit, *args):
+    """
+    Awaits the hashing pool, turning saturation into a 503 so that clients
+    back off instead of queueing behind a login burst.
+    """
+
+    try:
+        future = submit(*args)
+
+    except HashingPoolSaturated as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(exc.retry_after)}
+        )
+
+    return await asyncio.wrap_future(future)
 
 # --- SCHEMAS ---
 
@@ -168,26 +337,77 @@ class RegisterRequest(BaseModel):
 
 class GenericSubmission(BaseModel):
     test_type: str
-    accuracy_percent: float
+    accuracy_percent: float = Field(ge=0, le=100, allow_inf_nan=False)
 
 
 class ChatRequest(BaseModel):
     message: str
 
 
+class CohortRequest(BaseModel):
+    class_id: Optional[str] = None
+    user_ids: Optional[List[int]] = None
+    at_risk_limit: int = 100
+
+
+class ClassRosterRequest(BaseModel):
+    user_ids: List[int]
+
+
+class AgentSummaryBatchRequest(BaseModel):
+    user_ids: List[int]
+
+# --- RISK SCORING ---
+
+# Accuracy below 50% is High risk, below 80% Moderate, otherwise Low.
+RISK_THRESHOLDS = [50, 80]
+RISK_LABELS = ["High", "Moderate", "Low"]
+
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "1000"))
+
+
+def risk_levels_for(accuracies: List[float]) -> List[str]:
+
+    return [
+        RISK_LABELS[bisect_right(RISK_THRESHOLDS, accuracy)]
+        for accuracy in accuracies
+    ]
+
+
+def risk_level_for(accuracy_percent: float) -> str:
+
+    return risk_levels_for([accuracy_percent])[0]
+
+
+def insert_scores(user_id: int, rows: List[dict]):
+    """
+    Write-queue job inserting one user's score rows with one executemany and
+    folding them into the user's summary in the same transaction. Returns
+    the user's updated subtype vector.
+    """
+
+    async def job(session: AsyncSession):
+        await session.execute(insert(DBScore), rows)
+        summary = await record_scores(session, user_id, rows)
+
+        return subtype_vector(summary.best_by_test_type, summary.accuracy_mean or 0.0)
+
+    return job
+
+
 # ============================================================
 # 1. AUTH ROUTES
 # ============================================================
 
 @app.post("/auth/register")
-def register(
+async def register(
     req: RegisterRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
 
-    existing_user = db.query(DBUser).filter(
-        DBUser.email == req.email
-    ).first()
+    existing_user = (await db.execute(
+        select(DBUser.id).where(DBUser.email == req.email)
+    )).first()
 
     if existing_user:
         raise HTTPException(
@@ -195,15 +415,27 @@ def register(
             detail="User already exists"
         )
 
+    # Hand the connection back before the slow hash.
+    await db.close()
+
     new_user = DBUser(
         email=req.email,
-        hashed_password=PWD_CONTEXT.hash(req.password),
+        hashed_password=await run_hashing(hashing_pool.hash, req.password),
         first_name=req.first_name,
         age=req.age
     )
 
-    db.add(new_user)
-    db.commit()
+    async def add_user(session: AsyncSession):
+        session.add(new_user)
+
+    try:
+        await write_queue.run(add_user)
+
+    except IntegrityError:
+        raise HTTPException(
+            status_code=400,
+            detail="User already exists"
+        )
 
     return {
         "message": "User created successfully"
@@ -211,14 +443,14 @@ def register(
 
 
 @app.post("/auth/token")
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
 
-    user = db.query(DBUser).filter(
-        DBUser.email == form_data.username
-    ).first()
+    user = (await db.execute(
+        select(DBUser).where(DBUser.email == form_data.username)
+    )).scalars().first()
 
     if not user:
         raise HTTPException(
@@ -226,15 +458,33 @@ def login(
             detail="Invalid credentials"
         )
 
-    if not PWD_CONTEXT.verify(
+    # Hand the connection back before the slow verify.
+    await db.close()
+
+    valid, upgraded_hash = await run_hashing(
+        hashing_pool.verify_and_update,
         form_data.password,
         user.hashed_password
-    ):
+    )
+
+    if not valid:
         raise HTTPException(
             status_code=401,
             detail="Invalid credentials"
         )
 
+    # Transparently move the stored hash to the configured cost.
+    if upgraded_hash:
+
+        async def store_upgraded_hash(session: AsyncSession):
+            await session.execute(
+                update(DBUser)
+                .where(DBUser.id == user.id)
+                .values(hashed_password=upgraded_hash)
+            )
+
+        await write_queue.run(store_upgraded_hash)
+
     token = jwt.encode(
         {
             "sub": user.email,
@@ -251,8 +501,8 @@ def login(
 
 
 @app.get("/api/user/me")
-def get_me(
-    current_user: DBUser = Depends(get_current_user)
+async def get_me(
+    current_user: Principal = Depends(get_current_user)
 ):
 
     return {
@@ -267,44 +517,298 @@ def get_me(
 
 @app.post("/api/assessment/submit")
 @app.post("/api/screening/submit")
-def submit_test(
+async def submit_test(
     sub: GenericSubmission,
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
 
-    risk = (
-        "High"
-        if sub.accuracy_percent < 50
-        else "Moderate"
-        if sub.accuracy_percent < 80
-        else "Low"
-    )
+    risk = risk_level_for(sub.accuracy_percent)
 
-    new_score = DBScore(
-        user_id=current_user.id,
-        test_type=sub.test_type,
-        accuracy_percent=sub.accuracy_percent,
-        risk_level=risk
-    )
+    vector = await write_queue.run(insert_scores(current_user.id, [
+        {
+            "user_id": current_user.id,
+            "test_type": sub.test_type,
+            "accuracy_percent": sub.accuracy_percent,
+            "risk_level": risk,
+            "created_at": datetime.utcnow()
+        }
+    ]))
 
-    db.add(new_score)
-    db.commit()
+    subtype_index.upsert(current_user.id, vector)
 
     return {
         "risk_level": risk
     }
 
 
-@app.get("/api/assessment/history")
-def get_history(
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+def _too_many_items():
+
+    return HTTPException(
+        status_code=413,
+        detail=f"Batch limited to {MAX_BATCH_ITEMS} submissions"
+    )
+
+
+async def read_batch_items(request: Request) -> list:
+    """
+    Reads a batch body as either a JSON array or an NDJSON stream.
+
+    NDJSON lines are returned undecoded so that a malformed line only
+    fails its own item instead of the whole batch.
+    """
+
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type or "jsonlines" in content_type:
+
+        items = []
+        pending = b""
+
+        async for chunk in request.stream():
+
+            *lines, pending = (pending + chunk).split(b"\n")
+            items.extend(line for line in lines if line.strip())
+
+            if len(items) > MAX_BATCH_ITEMS:
+                raise _too_many_items()
+
+        if pending.strip():
+            items.append(pending)
+
+        if len(items) > MAX_BATCH_ITEMS:
+            raise _too_many_items()
+
+        return items
+
+    try:
+        payload = json.loads(await request.body())
+
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Body must be a JSON array or an NDJSON stream"
+        )
+
+    if not isinstance(payload, list):
+        raise HTTPException(
+            status_code=400,
+            detail="Body must be a JSON array or an NDJSON stream"
+        )
+
+    if len(payload) > MAX_BATCH_ITEMS:
+        raise _too_many_items()
+
+    return payload
+
+
+def parse_submission(raw) -> GenericSubmission:
+
+    if isinstance(raw, (bytes, str)):
+        raw = json.loads(raw)
+
+    if not isinstance(raw, dict):
+        raise ValueError("Each submission must be a JSON object")
+
+    return GenericSubmission(**raw)
+
+
+def describe_invalid(exc: ValueError):
+
+    if hasattr(exc, "errors"):
+        return [
+            {"loc": list(err["loc"]), "msg": err["msg"]}
+            for err in exc.errors()
+        ]
+
+    return str(exc)
+
+
+@app.post("/api/assessment/submit/batch")
+@app.post("/api/screening/submit/batch")
+async def submit_test_batch(
+    request: Request,
+    current_user: Principal = Depends(get_current_user)
+):
+
+    raw_items = await read_batch_items(request)
+
+    results = []
+    accepted = []
+
+    for index, raw in enumerate(raw_items):
+
+        try:
+            sub = parse_submission(raw)
+
+        except ValueError as exc:
+            results.append({
+                "index": index,
+                "status": "rejected",
+                "error": describe_invalid(exc)
+            })
+            continue
+
+        accepted.append((index, sub))
+        results.append(None)
+
+    risks = risk_levels_for([sub.accuracy_percent for _, sub in accepted])
+    created_at = datetime.utcnow()
+
+    rows = [
+        {
+            "user_id": current_user.id,
+            "test_type": sub.test_type,
+            "accuracy_percent": sub.accuracy_percent,
+            "risk_level": risk,
+            "created_at": created_at
+        }
+        for (_, sub), risk in zip(accepted, risks)
+    ]
+
+    if rows:
+        vector = await write_queue.run(insert_scores(current_user.id, rows))
+        subtype_index.upsert(current_user.id, vector)
+
+    for (index, _), risk in zip(accepted, risks):
+        results[index] = {
+            "index": index,
+            "status": "accepted",
+            "risk_level": risk
+        }
+
+    return {
+        "received": len(raw_items),
+        "accepted": len(accepted),
+        "rejected": len(raw_items) - len(accepted),
+        "results": results
+    }
+
+
+@app.get("/api/assessment/summary")
+async def get_assessment_summary(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
 
-    return db.query(DBScore).filter(
+    async def build():
+
+        summary = await db.get(DBUserSummary, current_user.id)
+
+        if not summary:
+            raise HTTPException(
+                status_code=404,
+                detail="No assessment submitted yet"
+            )
+
+        return summary_payload(summary)
+
+    return await cached_for_user(request, current_user.id, "assessment_summary", build)
+
+
+HISTORY_FIELDS = {
+    "id": DBScore.id,
+    "user_id": DBScore.user_id,
+    "test_type": DBScore.test_type,
+    "accuracy_percent": DBScore.accuracy_percent,
+    "risk_level": DBScore.risk_level,
+    "created_at": DBScore.created_at
+}
+
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 500
+
+
+def encode_history_cursor(created_at: datetime, score_id: int) -> str:
+
+    raw = json.dumps([created_at.isoformat(), score_id]).encode()
+
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str):
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, score_id = json.loads(raw)
+
+        return datetime.fromisoformat(created_at), int(score_id)
+
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid cursor"
+        )
+
+
+def parse_history_fields(fields: Optional[str]) -> List[str]:
+
+    if not fields:
+        return list(HISTORY_FIELDS)
+
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in HISTORY_FIELDS]
+
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. "
+                   f"Allowed: {', '.join(HISTORY_FIELDS)}"
+        )
+
+    return names
+
+
+@app.get("/api/assessment/history")
+async def get_history(
+    response: Response,
+    limit: int = HISTORY_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    latest: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Newest-first history, paginated by keyset on (created_at, id).
+
+    The next page's cursor is returned in the X-Next-Cursor header so the
+    body stays a plain list. `latest=1` returns just the most recent score.
+    """
+
+    names = parse_history_fields(fields)
+    limit = 1 if latest else max(1, min(limit, HISTORY_MAX_LIMIT))
+
+    # created_at and id are always selected because the cursor needs them.
+    query = select(
+        DBScore.created_at,
+        DBScore.id,
+        *[HISTORY_FIELDS[name] for name in names]
+    ).where(
         DBScore.user_id == current_user.id
-    ).all()
+    )
+
+    if cursor and not latest:
+        query = query.where(
+            tuple_(DBScore.created_at, DBScore.id) < decode_history_cursor(cursor)
+        )
+
+    rows = (await db.execute(
+        query
+        .order_by(DBScore.created_at.desc(), DBScore.id.desc())
+        .limit(limit + 1)
+    )).all()
+
+    page = rows[:limit]
+
+    if len(rows) > limit and not latest:
+        last = page[-1]
+        response.headers["X-Next-Cursor"] = encode_history_cursor(last[0], last[1])
+
+    return [
+        dict(zip(names, row[2:]))
+        for row in page
+    ]
 
 # ============================================================
 # 3. QUEST ROUTES
@@ -312,122 +816,246 @@ def get_history(
 
 @app.get("/api/quests")
 @app.get("/api/skill-quest")
-def get_all_quests(
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+async def get_all_quests(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
 
-    static_data = [
-        {
-            "title": "Phoneme Peak",
-            "module": "phonics-1"
-        },
-        {
-            "title": "CVC Kingdom",
-            "module": "cvc-2"
-        },
-        {
-            "title": "Letter Mirror",
-            "module": "mirror-3"
-        }
-    ]
+    async def build():
 
-    output = []
+        progress = dict((await db.execute(
+            select(
+                DBQuestProgress.module_name,
+                func.max(DBQuestProgress.progress_percent)
+            )
+            .where(DBQuestProgress.user_id == current_user.id)
+            .group_by(DBQuestProgress.module_name)
+        )).all())
 
-    for item in static_data:
+        return quest_catalog.with_progress(progress)
 
-        prog = db.query(DBQuestProgress).filter(
-            DBQuestProgress.user_id == current_user.id,
-            DBQuestProgress.module_name == item["module"]
-        ).first()
+    return await cached_for_user(request, current_user.id, "quests", build)
 
-        output.append({
-            **item,
-            "progress": prog.progress_percent if prog else 0
-        })
 
-    return output
+CURRENT_TASK = CachedPayload.from_content({
+    "current_module": "Phoneme Peak",
+    "status": "In Progress"
+})
 
 
 @app.get("/api/intervention/current")
-def get_current_task():
+async def get_current_task(request: Request):
 
-    return {
-        "current_module": "Phoneme Peak",
-        "status": "In Progress"
-    }
+    return CURRENT_TASK.respond(request)
 
 # ============================================================
 # 4. CHAT ROUTE
 # ============================================================
 
+def sse_event(data: dict, event: Optional[str] = None) -> bytes:
+
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + dumps(data) + b"\n\n"
+
+
 @app.post("/api/chat/gemini")
-def local_chat(req: ChatRequest):
+async def local_chat(
+    req: ChatRequest,
+    request: Request,
+    stream: bool = False
+):
 
-    return {
-        "response_text": "You are doing amazing! Keep learning step by step."
-    }
+    answer = tutor.answer(req.message)
+
+    # Stream as server-sent events when asked, so the first words render
+    # immediately; plain JSON otherwise.
+    if not (stream or "text/event-stream" in request.headers.get("accept", "")):
+        return {
+            "response_text": answer.text,
+            "hint_id": answer.hint_id
+        }
+
+    async def events():
+        for chunk in answer.chunks:
+            yield sse_event({"delta": chunk})
+
+        yield sse_event({"hint_id": answer.hint_id}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
 
 # ============================================================
 # 5. SUPPORT ROUTES
 # ============================================================
 
+SUPPORT_RESOURCES = CachedPayload.from_content([
+    {
+        "title": "Dyslexia FAQ",
+        "url": "/docs/faq.pdf"
+    }
+])
+
+
 @app.get("/api/support/resources")
-def get_resources():
+async def get_resources(request: Request):
 
-    return [
-        {
-            "title": "Dyslexia FAQ",
-            "url": "/docs/faq.pdf"
-        }
-    ]
+    return SUPPORT_RESOURCES.respond(request)
 
 # ============================================================
 # 6. HEALTHCARE AI AGENT ROUTES
 # ============================================================
 
 @app.get("/api/fhir/patient/me")
-def get_my_fhir_patient(
-    current_user: DBUser = Depends(get_current_user)
+async def get_my_fhir_patient(
+    request: Request,
+    current_user: Principal = Depends(get_current_user)
 ):
 
-    return {
-        "resourceType": "Patient",
-        "id": f"child-{current_user.id}",
-        "name": [
-            {
-                "given": [current_user.first_name]
-            }
-        ],
-        "extension": [
-            {
-                "url": "https://dyslexicore.ai/fhir/StructureDefinition/learning-risk-context",
-                "valueString": "Dyslexia screening candidate"
+    async def build():
+
+        return patient_resource(current_user.id, current_user.first_name)
+
+    return await cached_for_user(request, current_user.id, "fhir_patient", build)
+
+
+# --- BULK EXPORT ---
+
+def export_status_url(request: Request, job_id: str) -> str:
+
+    return str(request.url_for("get_fhir_export_status", job_id=job_id))
+
+
+def get_export_job(job_id: str, current_user: Principal):
+
+    job = fhir_exports.get(job_id)
+
+    if job is None or job.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=404,
+            detail="Export job not found"
+        )
+
+    return job
+
+
+@app.get("/api/fhir/$export")
+async def start_fhir_export(
+    request: Request,
+    _since: Optional[str] = None,
+    _type: Optional[str] = None,
+    staff_user: Principal = Depends(get_staff_user)
+):
+
+    try:
+        since = parse_instant(_since) if _since else None
+        types = parse_types(_type)
+
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=400,
+            detail=str(exc)
+        )
+
+    job = fhir_exports.start(staff_user.id, str(request.url), since, types)
+
+    if job is None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many exports running, please retry shortly",
+            headers={"Retry-After": "30"}
+        )
+
+    return Response(
+        status_code=202,
+        headers={"Content-Location": export_status_url(request, job.id)}
+    )
+
+
+@app.get("/api/fhir/$export-status/{job_id}")
+async def get_fhir_export_status(
+    job_id: str,
+    request: Request,
+    staff_user: Principal = Depends(get_staff_user)
+):
+
+    job = get_export_job(job_id, staff_user)
+
+    if job.status == "in-progress":
+        return Response(
+            status_code=202,
+            headers={
+                "X-Progress": job.progress(),
+                "Retry-After": "2"
             }
-        ]
-    }
+        )
 
+    if job.status != "completed":
+        raise HTTPException(
+            status_code=500,
+            detail=job.error or f"Export {job.status}"
+        )
 
-@app.get("/api/agent/summary")
-def get_agent_summary(
-    db: Session = Depends(get_db),
-    current_user: DBUser = Depends(get_current_user)
+    return job.manifest(
+        lambda job, file_name: str(request.url_for(
+            "get_fhir_export_file",
+            job_id=job.id,
+            file_name=file_name
+        ))
+    )
+
+
+@app.delete("/api/fhir/$export-status/{job_id}", status_code=202)
+async def delete_fhir_export(
+    job_id: str,
+    staff_user: Principal = Depends(get_staff_user)
+):
+
+    get_export_job(job_id, staff_user)
+    fhir_exports.delete(job_id)
+
+    return Response(status_code=202)
+
+
+@app.get("/api/fhir/$export-files/{job_id}/{file_name}")
+async def get_fhir_export_file(
+    job_id: str,
+    file_name: str,
+    staff_user: Principal = Depends(get_staff_user)
 ):
 
-    latest_score = (
-        db.query(DBScore)
-        .filter(DBScore.user_id == current_user.id)
-        .order_by(DBScore.created_at.desc())
-        .first()
+    job = get_export_job(job_id, staff_user)
+    path = fhir_exports.file_path(job, file_name)
+
+    if path is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Export file not found"
+        )
+
+    # Served as stored; Content-Encoding lets HTTP clients inflate it.
+    return FileResponse(
+        path,
+        media_type="application/fhir+ndjson",
+        headers={"Content-Encoding": "gzip"}
     )
 
-    if not latest_score:
+
+def agent_summary(user_id: int, first_name: Optional[str], summary: Optional[DBUserSummary]) -> dict:
+
+    if not summary:
 
         return {
             "agent": "DyslexiCore Agent",
             "patient_context": {
-                "id": f"child-{current_user.id}",
-                "name": current_user.first_name
+                "id": f"child-{user_id}",
+                "name": first_name
             },
             "assessment": "No assessment submitted yet.",
             "recommendation": "Complete the screening first."
@@ -438,16 +1066,18 @@ def get_agent_summary(
 
         "patient_context": {
             "resourceType": "Patient",
-            "id": f"child-{current_user.id}",
-            "name": current_user.first_name
+            "id": f"child-{user_id}",
+            "name": first_name
         },
 
         "assessment": {
-            "test_type": latest_score.test_type,
-            "accuracy_percent": latest_score.accuracy_percent,
-            "risk_level": latest_score.risk_level
+            "test_type": summary.latest_test_type,
+            "accuracy_percent": summary.latest_accuracy,
+            "risk_level": summary.latest_risk_level
         },
 
+        "assessment_summary": summary_payload(summary),
+
         "detected_indicators": [
             "phoneme confusion",
             "letter reversal tendency",
@@ -465,22 +1095,388 @@ def get_agent_summary(
     }
 
 
+@app.get("/api/agent/summary")
+async def get_agent_summary(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+
+    async def build():
+
+        summary = await db.get(DBUserSummary, current_user.id)
+
+        return agent_summary(current_user.id, current_user.first_name, summary)
+
+    return await cached_for_user(request, current_user.id, "agent_summary", build)
+
+
+# Children per query in the batch summary, so the first lines stream before
+# the whole cohort is read. Not a bound-parameter workaround: a full
+# MAX_COHORT_SIZE list fits in one IN (...) under SQLite's limit (32766 since
+# 3.32), which cohort analytics relies on too.
+AGENT_SUMMARY_CHUNK = int(os.getenv("AGENT_SUMMARY_CHUNK", "500"))
+
+
+@app.post("/api/agent/summary/batch")
+async def get_agent_summaries(
+    req: AgentSummaryBatchRequest,
+    current_user: Principal = Depends(get_current_user)
+):
+
+    user_ids = list(dict.fromkeys(req.user_ids))
+
+    check_cohort_size(user_ids)
+
+    if current_user.role not in STAFF_ROLES and set(user_ids) - {current_user.id}:
+        raise HTTPException(
+            status_code=403,
+            detail="Staff account required for other children"
+        )
+
+    async def lines():
+
+        # Own session: a dependency's session is closed before the body streams.
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(user_ids), AGENT_SUMMARY_CHUNK):
+                chunk = user_ids[start:start + AGENT_SUMMARY_CHUNK]
+
+                # One query per chunk: the summary row already holds each
+                # child's latest score, so no per-child ORDER BY scan. Plain
+                # rows, not ORM objects; they carry the summary's column names.
+                rows = {
+                    row.id: row
+                    for row in (await db.execute(
+                        select(DBUser.id, DBUser.first_name, DBUserSummary.__table__)
+                        .outerjoin(DBUserSummary, DBUserSummary.user_id == DBUser.id)
+                        .where(DBUser.id.in_(chunk))
+                    )).all()
+                }
+
+                yield b"".join(
+                    dumps(
+                        agent_summary(
+                            user_id,
+                            rows[user_id].first_name,
+                            rows[user_id] if rows[user_id].user_id is not None else None
+                        )
+                        if user_id in rows else
+                        {"patient_context": {"id": f"child-{user_id}"}, "error": "Patient not found"}
+                    ) + b"\n"
+                    for user_id in chunk
+                )
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson"
+    )
+
+
+SIMILAR_MAX_K = int(os.getenv("SIMILAR_MAX_K", "50"))
+
+
+@app.get("/api/agent/similar/{user_id}")
+async def get_similar_children(
+    user_id: int,
+    k: int = 5,
+    db: AsyncSession = Depends(get_db),
+    staff_user: Principal = Depends(get_staff_user)
+):
+    """
+    The k children whose subtype vectors (best accuracy per test type) are
+    nearest to this child's, nearest first.
+    """
+
+    summary = await db.get(DBUserSummary, user_id)
+
+    if not summary:
+        raise HTTPException(
+            status_code=404,
+            detail="No assessment submitted yet"
+        )
+
+    k = max(1, min(k, SIMILAR_MAX_K))
+    vector = subtype_vector(summary.best_by_test_type, summary.accuracy_mean or 0.0)
+
+    await asyncio.to_thread(refresh_subtype_index, subtype_index, load_subtype_vectors)
+    labels, distances = subtype_index.query(vector, k=k, exclude=user_id)
+
+    return {
+        "id": f"child-{user_id}",
+        "subtype_vector": dict(zip(SUBTYPE_TEST_TYPES, vector.tolist())),
+        "similar": [
+            {
+                "id": f"child-{label}",
+                "distance": float(distance) ** 0.5
+            }
+            for label, distance in zip(labels.tolist(), distances.tolist())
+        ]
+    }
+
+
+AGENT_CARD = CachedPayload.from_content({
+    "name": "DyslexiCore Agent",
+
+    "description":
+        "Healthcare AI agent for early dyslexia screening and intervention.",
+
+    "version": "1.0.0",
+
+    "capabilities": [
+        "FHIR patient context",
+        "dyslexia risk scoring",
+        "phoneme confusion detection",
+        "intervention recommendation",
+        "parent dashboard summary"
+    ]
+})
+
+
 @app.get("/api/agent/card")
-def get_agent_card():
+async def get_agent_card(request: Request):
+
+    return AGENT_CARD.respond(request)
+
+# ============================================================
+# 7. COHORT ROUTES
+# ============================================================
+
+def check_cohort_size(user_ids: Optional[List[int]]):
+
+    if user_ids is not None and len(user_ids) > MAX_COHORT_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_COHORT_SIZE} children per cohort"
+        )
+
+
+@app.post("/api/cohort/analytics")
+async def get_cohort_analytics(
+    req: CohortRequest,
+    db: AsyncSession = Depends(get_db),
+    staff_user: Principal = Depends(get_staff_user)
+):
+
+    if (req.class_id is None) == (req.user_ids is None):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide either class_id or user_ids"
+        )
+
+    check_cohort_size(req.user_ids)
+
+    return await cohort_analytics(
+        db,
+        cohort_members(req.class_id, req.user_ids),
+        at_risk_limit=max(0, req.at_risk_limit)
+    )
+
+
+@app.put("/api/cohort/classes/{class_id}/members")
+async def set_class_members(
+    class_id: str,
+    req: ClassRosterRequest,
+    staff_user: Principal = Depends(get_staff_user)
+):
+
+    check_cohort_size(req.user_ids)
+
+    user_ids = list(dict.fromkeys(req.user_ids))
+
+    async def replace_roster(session: AsyncSession):
+        await session.execute(
+            delete(DBClassMember).where(DBClassMember.class_id == class_id)
+        )
+
+        if user_ids:
+            await session.execute(insert(DBClassMember), [
+                {"class_id": class_id, "user_id": user_id}
+                for user_id in user_ids
+            ])
+
+    await write_queue.run(replace_roster)
 
     return {
-        "name": "DyslexiCore Agent",
+        "class_id": class_id,
+        "members": len(user_ids)
+    }
 
-        "description":
-            "Healthcare AI agent for early dyslexia screening and intervention.",
+# ============================================================
+# 8. TELEMETRY ROUTES
+# ============================================================
 
-        "version": "1.0.0",
+async def read_telemetry_chunk(request: Request, seq: Optional[int]):
+    """
+    Decodes one chunk: packed EVENT_DTYPE records (application/octet-stream,
+    `seq` in the query string) or a JSON object of parallel arrays
+    {"seq", "t", "rt", "target", "hit"}.
+    """
 
-        "capabilities": [
-            "FHIR patient context",
-            "dyslexia risk scoring",
-            "phoneme confusion detection",
-            "intervention recommendation",
-            "parent dashboard summary"
-        ]
-    }
\ No newline at end of file
+    body = await request.body()
+
+    # Generous enough for the JSON encoding; the event count is checked below.
+    if len(body) > TELEMETRY_MAX_CHUNK * EVENT_DTYPE.itemsize * 8:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Chunks are limited to {TELEMETRY_MAX_CHUNK} events"
+        )
+
+    if "octet-stream" in request.headers.get("content-type", ""):
+        columns = None
+
+    else:
+        try:
+            columns = json.loads(body)
+
+        except ValueError:
+            columns = None
+
+        if not isinstance(columns, dict):
+            raise HTTPException(
+                status_code=400,
+                detail="Body must be a JSON object of event arrays"
+            )
+
+        seq = columns.get("seq")
+
+    if not isinstance(seq, int) or isinstance(seq, bool) or not 0 <= seq < 2 ** 32:
+        raise HTTPException(
+            status_code=400,
+            detail="seq must be a chunk number in [0, 2**32)"
+        )
+
+    try:
+        if columns is None:
+            events = events_from_bytes(seq, body)
+        else:
+            events = events_from_columns(seq, columns)
+
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=400,
+            detail=str(exc)
+        )
+
+    if len(events) > TELEMETRY_MAX_CHUNK:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Chunks are limited to {TELEMETRY_MAX_CHUNK} events"
+        )
+
+    return events
+
+
+def check_telemetry_session(session_id: str):
+
+    try:
+        check_session_id(session_id)
+
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=400,
+            detail=str(exc)
+        )
+
+
+@app.post("/api/telemetry/sessions/{session_id}/events")
+async def ingest_telemetry(
+    session_id: str,
+    request: Request,
+    seq: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+
+    check_telemetry_session(session_id)
+
+    events = await read_telemetry_chunk(request, seq)
+
+    try:
+        stored, features = await asyncio.to_thread(
+            telemetry_store.append,
+            current_user.id,
+            session_id,
+            events
+        )
+
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=409,
+            detail=str(exc)
+        )
+
+    return {
+        "session_id": session_id,
+        "accepted": len(events) if stored else 0,
+        "duplicate": not stored and len(events) > 0,
+        "features": features
+    }
+
+
+@app.get("/api/telemetry/sessions/{session_id}/features")
+async def get_telemetry_features(
+    session_id: str,
+    current_user: Principal = Depends(get_current_user)
+):
+
+    check_telemetry_session(session_id)
+
+    features = await asyncio.to_thread(
+        telemetry_store.features,
+        current_user.id,
+        session_id
+    )
+
+    if features is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No telemetry for this session"
+        )
+
+    return features
+
+# ============================================================
+# 9. SYSTEM ROUTES
+# ============================================================
+
+@app.get("/api/system/cache-stats")
+async def get_cache_stats():
+
+    return {
+        "principals": principal_cache.stats(),
+        "password_hashing": hashing_pool.stats(),
+        "write_queue": write_queue.stats(),
+        "responses": response_cache.stats(),
+        "model": model_registry.stats(),
+        "recommendations": recommendation_cache.stats(),
+        "subtype_index": subtype_index.stats(),
+        "telemetry": telemetry_store.stats(),
+        "fhir_export": fhir_exports.stats()
+    }
+
+
+def ai_samples():
+
+    model = model_registry.stats()
+    current = model["current"] or {}
+    cache = recommendation_cache.stats()
+
+    return [
+        ("dyslexicore_model_loaded", "gauge", "1 once the recommendation model is loaded.", int(model["loaded"])),
+        ("dyslexicore_model_loads_total", "counter", "Model versions loaded, including swaps.", model["loads"]),
+        ("dyslexicore_model_load_seconds", "gauge", "Load time of the current model version.", current.get("load_seconds") or 0),
+        ("dyslexicore_model_weights_bytes", "gauge", "Weight bytes of the current model version.", current.get("weights_bytes") or 0),
+        ("dyslexicore_model_in_flight", "gauge", "Calls running on the current model version.", current.get("in_flight", 0)),
+        ("dyslexicore_recommendation_cache_hits_total", "counter", "Single-child recommendations served from cache.", cache["hits"]),
+        ("dyslexicore_recommendation_cache_misses_total", "counter", "Single-child recommendations computed.", cache["misses"]),
+        ("dyslexicore_recommendation_cache_hit_ratio", "gauge", "Recommendation cache hit rate.", cache["hit_rate"]),
+        ("dyslexicore_recommendation_cache_entries", "gauge", "Recommendations held in the cache.", cache["size"])
+    ]
+
+
+@app.get("/metrics")
+async def get_metrics():
+
+    return Response(
+        content=metrics.render(ai_samples()),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,274 @@
+# backend/metrics.py
+#
+# Request and SQL metrics in Prometheus text format.
+#
+# MetricsMiddleware is plain ASGI (no BaseHTTPMiddleware task hop). Per
+# request it costs two perf_counter() calls and a few dict updates under one
+# lock. Requests are labelled by route template ("/api/quests", not the raw
+# path), so label cardinality stays fixed.
+#
+# SQL is counted with engine events. The request in progress is tracked in a
+# ContextVar, so statements are charged to the route that ran them.
+# Statements outside any request (write-queue commits, startup) are charged
+# to route="(background)".
+#
+# With METRICS_SLOW_REQUEST_MS > 0, any request slower than that is logged
+# with the SQL it ran.
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "0"))
+
+# Upper bounds in seconds; +Inf is implied.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+BACKGROUND = ("", "(background)")
+
+slow_log = logging.getLogger("dyslexicore.slow_requests")
+
+
+class _RequestSQL:
+
+    __slots__ = ("statements", "seconds", "log", "started")
+
+    def __init__(self, capture: bool):
+        self.statements = 0
+        self.seconds = 0.0
+        self.log: Optional[List[Tuple[str, float]]] = [] if capture else None
+        self.started = 0.0
+
+
+_current: ContextVar[Optional[_RequestSQL]] = ContextVar("metrics_request_sql", default=None)
+
+
+class Histogram:
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+
+    def __init__(self, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.slow_request_ms = slow_request_ms
+
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.sql_statements: Dict[Tuple[str, str], int] = {}
+        self.sql_seconds: Dict[Tuple[str, str], float] = {}
+        self.slow_requests = 0
+
+    # --- SQL ---
+
+    def instrument(self, *engines):
+        """Hooks the cursor events of sync engines (use .sync_engine for async ones)."""
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        sql = _current.get()
+
+        if sql is not None:
+            sql.started = time.perf_counter()
+        else:
+            conn.info["metrics_started"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        now = time.perf_counter()
+        sql = _current.get()
+
+        if sql is not None:
+            elapsed = now - sql.started
+            sql.statements += 1
+            sql.seconds += elapsed
+
+            if sql.log is not None:
+                sql.log.append((statement, elapsed))
+
+            return
+
+        elapsed = now - conn.info.pop("metrics_started", now)
+
+        with self._lock:
+            self.sql_statements[BACKGROUND] = self.sql_statements.get(BACKGROUND, 0) + 1
+            self.sql_seconds[BACKGROUND] = self.sql_seconds.get(BACKGROUND, 0.0) + elapsed
+
+    # --- REQUESTS ---
+
+    def record(self, method: str, route: str, status: int, seconds: float, sql: _RequestSQL):
+        key = (method, route)
+
+        with self._lock:
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+
+            histogram = self.latency.get(key)
+
+            if histogram is None:
+                histogram = self.latency[key] = Histogram()
+
+            histogram.observe(seconds)
+
+            self.sql_statements[key] = self.sql_statements.get(key, 0) + sql.statements
+            self.sql_seconds[key] = self.sql_seconds.get(key, 0.0) + sql.seconds
+
+        if self.slow_request_ms and seconds * 1000 >= self.slow_request_ms:
+            with self._lock:
+                self.slow_requests += 1
+
+            slow_log.warning(
+                "%s %s %d took %.1f ms with %d SQL statements (%.1f ms)%s",
+                method,
+                route,
+                status,
+                seconds * 1000,
+                sql.statements,
+                sql.seconds * 1000,
+                "".join(
+                    f"\n  [{elapsed * 1000:.2f} ms] {statement}"
+                    for statement, elapsed in sql.log or ()
+                )
+            )
+
+    # --- EXPOSITION ---
+
+    def render(self, samples: Sequence[Tuple[str, str, str, float]] = ()) -> str:
+        """
+        Prometheus text for the request and SQL metrics, followed by
+        `samples`: (name, type, help, value) read from other components.
+        """
+        with self._lock:
+            requests = dict(self.requests)
+            latency = {
+                key: (list(h.counts), h.total, h.count)
+                for key, h in self.latency.items()
+            }
+            statements = dict(self.sql_statements)
+            seconds = dict(self.sql_seconds)
+            in_flight = self.in_flight
+
+        lines = [
+            "# HELP dyslexicore_http_requests_total Requests by route and status.",
+            "# TYPE dyslexicore_http_requests_total counter"
+        ]
+
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(
+                f'dyslexicore_http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}'
+            )
+
+        lines += [
+            "# HELP dyslexicore_http_request_duration_seconds Request latency by route.",
+            "# TYPE dyslexicore_http_request_duration_seconds histogram"
+        ]
+
+        for (method, route), (counts, total, count) in sorted(latency.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            cumulative = 0
+
+            for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(f'dyslexicore_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+
+            lines.append(f"dyslexicore_http_request_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"dyslexicore_http_request_duration_seconds_count{{{labels}}} {count}")
+
+        lines += [
+            "# HELP dyslexicore_http_requests_in_flight Requests currently being served.",
+            "# TYPE dyslexicore_http_requests_in_flight gauge",
+            f"dyslexicore_http_requests_in_flight {in_flight}",
+            "# HELP dyslexicore_db_statements_total SQL statements executed, by route.",
+            "# TYPE dyslexicore_db_statements_total counter"
+        ]
+
+        for (method, route), count in sorted(statements.items()):
+            lines.append(f'dyslexicore_db_statements_total{{method="{method}",route="{_escape(route)}"}} {count}')
+
+        lines += [
+            "# HELP dyslexicore_db_statement_seconds_total Time spent executing SQL, by route.",
+            "# TYPE dyslexicore_db_statement_seconds_total counter"
+        ]
+
+        for (method, route), total in sorted(seconds.items()):
+            lines.append(f'dyslexicore_db_statement_seconds_total{{method="{method}",route="{_escape(route)}"}} {total}')
+
+        for name, kind, help_text, value in samples:
+            lines += [
+                f"# HELP {name} {help_text}",
+                f"# TYPE {name} {kind}",
+                f"{name} {value}"
+            ]
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class MetricsMiddleware:
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        sql = _RequestSQL(capture=bool(metrics.slow_request_ms))
+        token = _current.set(sql)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+            await send(message)
+
+        with metrics._lock:
+            metrics.in_flight += 1
+
+        started = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+
+            with metrics._lock:
+                metrics.in_flight -= 1
+
+            # The router stores the matched route in the scope.
+            route = scope.get("route")
+            metrics.record(
+                scope["method"],
+                getattr(route, "path", "(unmatched)"),
+                status,
+                elapsed,
+                sql
+            )
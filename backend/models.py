@@ -1,7 +1,87 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Index, JSON
+from sqlalchemy.orm import relationship
+
+from database import Base
+
+# --- DATABASE MODELS ---
+
+class DBUser(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, unique=True, index=True)
+    hashed_password = Column(String)
+    first_name = Column(String)
+    age = Column(Integer)
+    role = Column(String, default="child")
+
+    scores = relationship("DBScore", back_populates="owner")
+    quest_progress = relationship("DBQuestProgress", back_populates="owner")
+
+
+class DBScore(Base):
+    __tablename__ = "scores"
+    __table_args__ = (
+        Index("ix_scores_user_created_id", "user_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+
+    test_type = Column(String)
+    accuracy_percent = Column(Float)
+    risk_level = Column(String)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    owner = relationship("DBUser", back_populates="scores")
+
+
 class DBQuestProgress(Base):
     __tablename__ = "quest_progress"
-    id = Column(Integer, primary_key=True)
+    __table_args__ = (
+        Index("ix_quest_progress_user_module", "user_id", "module_name"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    module_name = Column(String) # e.g., "CVC-Word-Building"
+
+    module_name = Column(String)
     progress_percent = Column(Float, default=0.0)
-    is_mastered = Column(Boolean, default=False)
\ No newline at end of file
+    is_mastered = Column(Boolean, default=False)
+
+    owner = relationship("DBUser", back_populates="quest_progress")
+
+
+class DBUserSummary(Base):
+    """One row per child, maintained in the same transaction as score inserts."""
+
+    __tablename__ = "user_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    session_count = Column(Integer, default=0)
+
+    latest_test_type = Column(String)
+    latest_accuracy = Column(Float)
+    latest_risk_level = Column(String)
+    latest_at = Column(DateTime)
+
+    # Exponentially weighted mean of accuracy and of its session-to-session change.
+    accuracy_mean = Column(Float)
+    accuracy_trend = Column(Float)
+
+    best_by_test_type = Column(JSON, default=dict)
+
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DBClassMember(Base):
+    """Classroom roster: which children belong to a teacher's class."""
+
+    __tablename__ = "class_members"
+
+    class_id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True, index=True)
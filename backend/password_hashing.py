@@ -0,0 +1,196 @@
+# backend/password_hashing.py
+#
+# Password hashing runs in a dedicated process pool so that a burst of
+# logins cannot pin the API workers. The pool has a bounded backlog; when it
+# is full, callers get HashingPoolSaturated and should answer 503.
+
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+# passlib's own default for sha256_crypt, i.e. the cost of every hash stored
+# before this setting existed.
+DEFAULT_HASH_ROUNDS = 535000
+
+HASH_ROUNDS = int(os.getenv("HASH_ROUNDS", str(DEFAULT_HASH_ROUNDS)))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "1"))
+
+
+@lru_cache(maxsize=8)
+def build_context(rounds: int) -> CryptContext:
+    """
+    Pinning min/max rounds to the target makes passlib flag any stored hash
+    with a different cost as needing an update.
+    """
+    return CryptContext(
+        schemes=["sha256_crypt"],
+        deprecated="auto",
+        sha256_crypt__default_rounds=rounds,
+        sha256_crypt__min_rounds=rounds,
+        sha256_crypt__max_rounds=rounds
+    )
+
+
+# Worker entry points (must be module-level so they can be pickled).
+
+def hash_password(secret: str, rounds: int) -> str:
+    return build_context(rounds).hash(secret)
+
+
+def verify_password(secret: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """Returns (is_valid, new_hash); new_hash is set when the cost changed."""
+    return build_context(rounds).verify_and_update(secret, hashed)
+
+
+class HashingPoolSaturated(Exception):
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing pool is saturated")
+        self.retry_after = retry_after
+
+
+class HashingPool:
+
+    def __init__(
+        self,
+        workers: int = HASH_WORKERS,
+        max_pending: int = HASH_MAX_PENDING,
+        rounds: int = HASH_ROUNDS,
+        retry_after: int = HASH_RETRY_AFTER
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max(0, max_pending)
+        self.rounds = rounds
+        self.retry_after = retry_after
+
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def hash(self, secret: str) -> Future:
+        return self._submit(hash_password, secret, self.rounds)
+
+    def verify_and_update(self, secret: str, hashed: str) -> Future:
+        return self._submit(verify_password, secret, hashed, self.rounds)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "rounds": self.rounds,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Started lazily so importing the app never forks.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise HashingPoolSaturated(self.retry_after)
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._stats_lock:
+            self.in_flight += 1
+
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        with self._stats_lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+        self._slots.release()
+
+
+# -----------------------
+# Micro-benchmark
+# -----------------------
+
+def _bench_serial(rounds: int, seconds: float) -> float:
+    context = build_context(rounds)
+    hashed = context.hash("benchmark-password")
+
+    done = 0
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < seconds:
+        context.verify("benchmark-password", hashed)
+        done += 1
+
+    return done / (time.perf_counter() - start)
+
+
+def _bench_pool(rounds: int, workers: int, seconds: float) -> float:
+    pool = HashingPool(workers=workers, max_pending=workers * 2, rounds=rounds)
+    hashed = build_context(rounds).hash("benchmark-password")
+
+    # Warm up the worker processes before timing.
+    for future in [pool.verify_and_update("x", hashed) for _ in range(workers)]:
+        future.result()
+
+    done = 0
+    pending = []
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < seconds:
+        while len(pending) < workers * 2:
+            pending.append(pool.verify_and_update("benchmark-password", hashed))
+
+        pending.pop(0).result()
+        done += 1
+
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return done / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Password verify throughput")
+    parser.add_argument("--rounds", type=int, default=HASH_ROUNDS)
+    parser.add_argument("--workers", type=int, default=HASH_WORKERS)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    serial = _bench_serial(args.rounds, args.seconds)
+    pooled = _bench_pool(args.rounds, args.workers, args.seconds)
+
+    print(f"rounds={args.rounds} workers={args.workers}")
+    print(f"single core:  {serial:.1f} verifies/s")
+    print(f"pool:         {pooled:.1f} verifies/s ({pooled / args.workers:.1f} per core)")
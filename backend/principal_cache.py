@@ -0,0 +1,129 @@
+# backend/principal_cache.py
+#
+# Bounded TTL/LRU cache of authenticated principals, keyed by bearer token.
+# A hit skips both the JWT signature check and the user lookup.
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Read-only snapshot of the fields routes read from the current user."""
+
+    id: int
+    email: str
+    first_name: str
+    age: Optional[int]
+    role: Optional[str]
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            first_name=user.first_name,
+            age=user.age,
+            role=user.role
+        )
+
+
+class PrincipalCache:
+    """
+    Maps token -> (principal, expires_at).
+
+    Entries expire at the earlier of the cache TTL and the token's own `exp`
+    claim, so a cached token can never outlive the JWT it came from.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(token)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            principal, expires_at = entry
+
+            if expires_at <= now:
+                self._drop(token)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl_seconds
+
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+
+        with self._lock:
+            if token in self._entries:
+                self._drop(token)
+
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._drop(token)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+    def _drop(self, token: str):
+        # Caller holds the lock.
+        principal, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(principal.id)
+
+        if tokens is not None:
+            tokens.discard(token)
+
+            if not tokens:
+                del self._tokens_by_user[principal.id]
@@ -0,0 +1,44 @@
+# backend/quest_catalog.py
+#
+# Quest module definitions, loaded once from content/quests.json and kept in
+# memory. Adding a quest is a data change; the progress lookup in
+# get_all_quests stays a single grouped query however many quests exist.
+
+import json
+import os
+from typing import Dict, List
+
+QUEST_CATALOG_PATH = os.getenv(
+    "QUEST_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "content", "quests.json")
+)
+
+
+class QuestCatalog:
+
+    def __init__(self, quests: List[dict]):
+        modules = [quest["module"] for quest in quests]
+
+        if len(set(modules)) != len(modules):
+            raise ValueError("Quest catalog has duplicate module ids")
+
+        self.quests = tuple(dict(quest) for quest in quests)
+        self.modules = tuple(modules)
+
+    @classmethod
+    def load(cls, path: str = QUEST_CATALOG_PATH) -> "QuestCatalog":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.quests)
+
+    def with_progress(self, progress_by_module: Dict[str, float]) -> List[dict]:
+        """Joins the catalog with one user's {module_name: progress} map."""
+        return [
+            {
+                **quest,
+                "progress": progress_by_module.get(quest["module"], 0)
+            }
+            for quest in self.quests
+        ]
@@ -0,0 +1,181 @@
+# backend/response_cache.py
+#
+# Pre-serialized JSON responses with strong ETags.
+#
+# - static payloads are encoded once at startup
+# - per-user payloads are encoded on first request and kept until a write
+#   touching that user commits (see the session hooks in main.py)
+# - If-None-Match hits answer 304 with no body
+#
+# orjson is used when installed; otherwise the stdlib encoder is used.
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default
+    ).encode("utf-8")
+
+
+def _default(value: Any):
+    # Matches orjson, which writes datetimes as ISO 8601 natively.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """Drop-in JSONResponse using `dumps`; set as the app's default_response_class."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    # If-None-Match uses weak comparison, so ignore any W/ prefix.
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class CachedPayload:
+
+    __slots__ = ("body", "etag", "cache_control")
+
+    def __init__(self, body: bytes, cache_control: str = "no-cache"):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.cache_control = cache_control
+
+    @classmethod
+    def from_content(cls, content: Any, cache_control: str = "no-cache") -> "CachedPayload":
+        return cls(dumps(content), cache_control)
+
+    def respond(self, request: Request) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": self.cache_control
+        }
+
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+
+        return Response(
+            content=self.body,
+            media_type="application/json",
+            headers=headers
+        )
+
+
+class ResponseCache:
+    """
+    LRU of per-user payloads keyed by (user_id, key).
+
+    Each user has a generation counter that invalidation bumps. A payload
+    built from a read that raced with a commit is only stored if the
+    generation it started from is still current.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[tuple, CachedPayload]" = OrderedDict()
+        self._keys_by_user: Dict[int, set] = {}
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, user_id: int, key: Hashable) -> Optional[CachedPayload]:
+        with self._lock:
+            payload = self._entries.get((user_id, key))
+
+            if payload is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end((user_id, key))
+            self.hits += 1
+            return payload
+
+    def put(self, user_id: int, key: Hashable, payload: CachedPayload, generation: int):
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+
+            self._entries[(user_id, key)] = payload
+            self._entries.move_to_end((user_id, key))
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                (old_user, old_key), _ = self._entries.popitem(last=False)
+                self._forget_key(old_user, old_key)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+            for key in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop((user_id, key), None)
+
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "json_encoder": "orjson" if orjson is not None else "json"
+            }
+
+    def _forget_key(self, user_id: int, key: Hashable):
+        # Caller holds the lock.
+        keys = self._keys_by_user.get(user_id)
+
+        if keys is not None:
+            keys.discard(key)
+
+            if not keys:
+                del self._keys_by_user[user_id]
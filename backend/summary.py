@@ -0,0 +1,152 @@
+# backend/summary.py
+#
+# Incrementally maintained per-child summaries (models.DBUserSummary).
+#
+# Score writes fold each new row into the child's summary inside the same
+# write-queue transaction, so summary reads are a primary-key lookup. To
+# backfill from existing scores, run:
+#
+#     python summary.py rebuild
+
+import argparse
+import os
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import SessionLocal, init_db
+from models import DBScore, DBUserSummary
+
+# Weight of the newest session in the rolling mean and trend.
+SUMMARY_EWMA_ALPHA = float(os.getenv("SUMMARY_EWMA_ALPHA", "0.3"))
+
+
+def new_summary(user_id: int) -> DBUserSummary:
+    return DBUserSummary(
+        user_id=user_id,
+        session_count=0,
+        best_by_test_type={}
+    )
+
+
+def fold_score(
+    summary: DBUserSummary,
+    test_type: str,
+    accuracy_percent: Optional[float],
+    risk_level: str,
+    created_at: datetime
+):
+    """
+    Folds one score into the summary. A score with no accuracy (NULL rows
+    from before submissions were validated) counts as a session but leaves
+    the mean, trend and bests alone.
+    """
+    alpha = SUMMARY_EWMA_ALPHA
+
+    if accuracy_percent is not None:
+        if summary.session_count and summary.latest_accuracy is not None:
+            change = accuracy_percent - summary.latest_accuracy
+            summary.accuracy_trend = alpha * change + (1 - alpha) * (summary.accuracy_trend or 0.0)
+        elif summary.accuracy_trend is None or not summary.session_count:
+            summary.accuracy_trend = 0.0
+
+        if summary.session_count and summary.accuracy_mean is not None:
+            summary.accuracy_mean = alpha * accuracy_percent + (1 - alpha) * summary.accuracy_mean
+        else:
+            summary.accuracy_mean = accuracy_percent
+
+    summary.session_count += 1
+    summary.latest_test_type = test_type
+    summary.latest_accuracy = accuracy_percent
+    summary.latest_risk_level = risk_level
+    summary.latest_at = created_at
+    summary.updated_at = datetime.utcnow()
+
+    bests = summary.best_by_test_type or {}
+
+    if accuracy_percent is not None and accuracy_percent > bests.get(test_type, float("-inf")):
+        # Reassign rather than mutate so the JSON column is marked dirty.
+        summary.best_by_test_type = {**bests, test_type: accuracy_percent}
+
+
+async def record_scores(session: AsyncSession, user_id: int, rows: Iterable[dict]):
+    """Folds freshly inserted score rows into the user's summary (write-queue job); returns it."""
+    summary = await session.get(DBUserSummary, user_id)
+
+    if summary is None:
+        summary = new_summary(user_id)
+        session.add(summary)
+        # Flush so later jobs in the same group commit find it by key.
+        await session.flush()
+
+    for row in rows:
+        fold_score(
+            summary,
+            row["test_type"],
+            row["accuracy_percent"],
+            row["risk_level"],
+            row["created_at"]
+        )
+
+    return summary
+
+
+def summary_payload(summary: DBUserSummary) -> dict:
+    return {
+        "session_count": summary.session_count,
+        "latest": {
+            "test_type": summary.latest_test_type,
+            "accuracy_percent": summary.latest_accuracy,
+            "risk_level": summary.latest_risk_level,
+            "created_at": summary.latest_at
+        },
+        "rolling_accuracy": summary.accuracy_mean,
+        "accuracy_trend": summary.accuracy_trend,
+        "best_by_test_type": summary.best_by_test_type or {}
+    }
+
+
+def rebuild_summaries(session_factory=SessionLocal) -> int:
+    """Recomputes every summary from the scores table in one ordered pass."""
+    with session_factory() as db:
+        db.execute(delete(DBUserSummary))
+
+        rows = db.execute(
+            select(
+                DBScore.user_id,
+                DBScore.test_type,
+                DBScore.accuracy_percent,
+                DBScore.risk_level,
+                DBScore.created_at
+            )
+            .where(DBScore.user_id.isnot(None))
+            .order_by(DBScore.user_id, DBScore.created_at, DBScore.id)
+            .execution_options(yield_per=1000)
+        )
+
+        summary = None
+        rebuilt = 0
+
+        for user_id, test_type, accuracy_percent, risk_level, created_at in rows:
+
+            if summary is None or summary.user_id != user_id:
+                summary = new_summary(user_id)
+                db.add(summary)
+                rebuilt += 1
+
+            fold_score(summary, test_type, accuracy_percent, risk_level, created_at)
+
+        db.commit()
+
+    return rebuilt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain per-child summaries")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    init_db()
+    print(f"Rebuilt {rebuild_summaries()} summaries")
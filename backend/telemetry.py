@@ -0,0 +1,336 @@
+# backend/telemetry.py
+#
+# Raw game telemetry: append-only event logs plus incrementally extracted
+# features.
+#
+# Clients post events in numbered chunks, as parallel arrays (JSON) or as
+# packed EVENT_DTYPE records (application/octet-stream). Each chunk is
+# vectorized into numpy once, which makes three steps cheap:
+#
+# - appending it to <TELEMETRY_DIR>/<user_id>/<session_id>.events as
+#   fixed-size little-endian records
+# - folding it into the session's running features (counts, Welford/Chan
+#   reaction-time moments, target-switch counters)
+# - dropping retried chunks by sequence number
+#
+# Running features live in a bounded LRU. A session evicted from it (or from
+# before a restart) is rebuilt by replaying its log.
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", "telemetry")
+
+TELEMETRY_MAX_CHUNK = int(os.getenv("TELEMETRY_MAX_CHUNK", "4096"))
+
+# Consecutive events on different targets closer together than this count as
+# a saccade-like jump.
+SACCADE_WINDOW_MS = float(os.getenv("TELEMETRY_SACCADE_WINDOW_MS", "250"))
+
+# 15 bytes per event, no padding.
+EVENT_DTYPE = np.dtype([
+    ("seq", "<u4"),         # chunk sequence number
+    ("t", "<u4"),           # ms since the session started
+    ("rt", "<f4"),          # reaction time in ms, NaN when there was none
+    ("target", "<u2"),      # target / stimulus id
+    ("hit", "u1")           # 1 = correct response
+])
+
+# Columns a JSON chunk must carry; `seq` comes from the chunk itself.
+EVENT_COLUMNS = ("t", "rt", "target", "hit")
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def check_session_id(session_id: str):
+    if not _SESSION_ID.match(session_id):
+        raise ValueError("session_id must be 1-64 letters, digits, '-' or '_'")
+
+
+def events_from_columns(seq: int, columns: Dict[str, list]) -> np.ndarray:
+    """Builds EVENT_DTYPE records from a JSON chunk's parallel arrays."""
+    missing = [name for name in EVENT_COLUMNS if name not in columns]
+
+    if missing:
+        raise ValueError(f"Missing event columns: {', '.join(missing)}")
+
+    if not all(isinstance(columns[name], list) for name in EVENT_COLUMNS):
+        raise ValueError("Event columns must be arrays")
+
+    length = len(columns["t"])
+
+    if any(len(columns[name]) != length for name in EVENT_COLUMNS):
+        raise ValueError("Event columns must have the same length")
+
+    try:
+        t = np.asarray(columns["t"], dtype=np.float64)
+        rt = np.asarray([np.nan if rt is None else rt for rt in columns["rt"]], dtype=np.float32)
+        target = np.asarray(columns["target"], dtype=np.int64)
+        hit = np.asarray(columns["hit"], dtype=np.int64) != 0
+
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("Event columns must be numeric")
+
+    if any(column.ndim != 1 for column in (t, rt, target, hit)):
+        raise ValueError("Event columns must be numeric")
+
+    if length and not (np.isfinite(t).all() and t.min() >= 0 and t.max() < 2 ** 32):
+        raise ValueError("t must be milliseconds in [0, 2**32)")
+
+    if length and (target.min() < 0 or target.max() > 0xFFFF):
+        raise ValueError("target must be in [0, 65535]")
+
+    events = np.empty(length, dtype=EVENT_DTYPE)
+    events["seq"] = seq
+    events["t"] = np.rint(t)
+    events["rt"] = rt
+    events["target"] = target
+    events["hit"] = hit
+
+    return check_order(events)
+
+
+def check_order(events: np.ndarray) -> np.ndarray:
+    if len(events) > 1 and (np.diff(events["t"].astype(np.int64)) < 0).any():
+        raise ValueError("Events must be in time order")
+
+    return events
+
+
+def events_from_bytes(seq: int, body: bytes) -> np.ndarray:
+    """Reads packed EVENT_DTYPE records; their `seq` field is overwritten."""
+    if len(body) % EVENT_DTYPE.itemsize:
+        raise ValueError(f"Body must be a multiple of {EVENT_DTYPE.itemsize} bytes")
+
+    events = np.frombuffer(body, dtype=EVENT_DTYPE).copy()
+    events["seq"] = seq
+    return check_order(events)
+
+
+class SessionFeatures:
+    """Running features for one session, updated a chunk at a time."""
+
+    def __init__(self):
+        self.last_seq = -1
+        self.chunks = 0
+        self.events = 0
+        self.hits = 0
+
+        self.first_t: Optional[int] = None
+        self.last_t: Optional[int] = None
+        self.last_target: Optional[int] = None
+
+        # Reaction-time count, mean and sum of squared deviations.
+        self.rt_count = 0
+        self.rt_mean = 0.0
+        self.rt_m2 = 0.0
+        self.hit_rt_sum = 0.0
+        self.hit_rt_count = 0
+
+        self.target_switches = 0
+        self.saccades = 0
+        self.regressions = 0
+
+    def update(self, events: np.ndarray):
+        if not len(events):
+            return
+
+        t = events["t"].astype(np.int64)
+        target = events["target"].astype(np.int64)
+        hit = events["hit"].astype(bool)
+        rt = events["rt"].astype(np.float64)
+
+        self.last_seq = int(events["seq"][-1])
+        self.chunks += 1
+        self.events += len(events)
+        self.hits += int(hit.sum())
+
+        # Reaction-time moments, merged with Chan et al.'s parallel formula.
+        valid = rt[~np.isnan(rt)]
+
+        if len(valid):
+            count = len(valid)
+            mean = float(valid.mean())
+            m2 = float(((valid - mean) ** 2).sum())
+            total = self.rt_count + count
+            delta = mean - self.rt_mean
+
+            self.rt_m2 += m2 + delta * delta * self.rt_count * count / total
+            self.rt_mean += delta * count / total
+            self.rt_count = total
+
+        hit_rt = rt[hit]
+        hit_rt = hit_rt[~np.isnan(hit_rt)]
+        self.hit_rt_sum += float(hit_rt.sum())
+        self.hit_rt_count += len(hit_rt)
+
+        # Transitions, including the one from the previous chunk's last event.
+        if self.last_t is not None:
+            t = np.concatenate(([self.last_t], t))
+            target = np.concatenate(([self.last_target], target))
+        else:
+            self.first_t = int(t[0])
+
+        gaps = np.diff(t)
+        switched = target[1:] != target[:-1]
+
+        self.target_switches += int(switched.sum())
+        self.saccades += int((switched & (gaps < SACCADE_WINDOW_MS)).sum())
+        self.regressions += int((target[1:] < target[:-1]).sum())
+
+        self.last_t = int(t[-1])
+        self.last_target = int(target[-1])
+
+    def to_dict(self) -> dict:
+        duration = (self.last_t - self.first_t) / 1000.0 if self.events else 0.0
+        return {
+            "chunks": self.chunks,
+            "last_seq": self.last_seq,
+            "events": self.events,
+            "hits": self.hits,
+            "accuracy": self.hits / self.events if self.events else None,
+            "duration_seconds": duration,
+            "naming_speed_per_second": self.hits / duration if duration > 0 else None,
+            "mean_hit_reaction_ms": self.hit_rt_sum / self.hit_rt_count if self.hit_rt_count else None,
+            "reaction_ms_mean": self.rt_mean if self.rt_count else None,
+            "reaction_ms_variance": self.rt_m2 / (self.rt_count - 1) if self.rt_count > 1 else None,
+            "target_switches": self.target_switches,
+            "saccades": self.saccades,
+            "saccades_per_second": self.saccades / duration if duration > 0 else None,
+            "regressions": self.regressions
+        }
+
+
+class TelemetryStore:
+
+    def __init__(self, root: str = TELEMETRY_DIR, max_sessions: int = 4096):
+        self.root = root
+        self.max_sessions = max_sessions
+
+        self._sessions: "OrderedDict[tuple, SessionFeatures]" = OrderedDict()
+        # Striped, so the lock count stays fixed however many sessions exist.
+        self._session_locks = [threading.Lock() for _ in range(64)]
+        self._lock = threading.Lock()
+
+        self.events_written = 0
+        self.duplicate_chunks = 0
+        self.replays = 0
+
+    def path_for(self, user_id: int, session_id: str) -> str:
+        return os.path.join(self.root, str(user_id), f"{session_id}.events")
+
+    def append(self, user_id: int, session_id: str, events: np.ndarray) -> Tuple[bool, dict]:
+        """
+        Appends one chunk; returns (stored, session features). A chunk whose
+        sequence number was already stored is a retry and is not stored.
+        Raises ValueError for a chunk that starts before the session's last
+        stored event. Blocking; call it from a worker thread.
+        """
+        key = (user_id, session_id)
+
+        with self._session_lock(key):
+            features = self._features(key)
+
+            if not len(events):
+                return False, features.to_dict()
+
+            if int(events["seq"][0]) <= features.last_seq:
+                with self._lock:
+                    self.duplicate_chunks += 1
+
+                return False, features.to_dict()
+
+            # The log stays in time order, so replayed gaps are never negative.
+            if features.last_t is not None and int(events["t"][0]) < features.last_t:
+                raise ValueError("Chunk starts before the session's last stored event")
+
+            path = self.path_for(user_id, session_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(path, "ab") as f:
+                # Cut a record left half-written by a crash, so new records
+                # stay aligned.
+                partial = f.tell() % EVENT_DTYPE.itemsize
+
+                if partial:
+                    f.truncate(f.tell() - partial)
+
+                f.write(events.tobytes())
+
+            features.update(events)
+
+            with self._lock:
+                self.events_written += len(events)
+
+            return True, features.to_dict()
+
+    def features(self, user_id: int, session_id: str) -> Optional[dict]:
+        key = (user_id, session_id)
+
+        with self._session_lock(key):
+            if key not in self._sessions and not os.path.exists(self.path_for(*key)):
+                return None
+
+            return self._features(key).to_dict()
+
+    def read_events(self, user_id: int, session_id: str) -> np.ndarray:
+        """Memory-maps a session's raw log, minus any partial trailing record."""
+        path = self.path_for(user_id, session_id)
+        count = os.path.getsize(path) // EVENT_DTYPE.itemsize
+
+        if not count:
+            return np.empty(0, dtype=EVENT_DTYPE)
+
+        return np.memmap(path, dtype=EVENT_DTYPE, mode="r", shape=(count,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_cached": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "events_written": self.events_written,
+                "duplicate_chunks": self.duplicate_chunks,
+                "replays": self.replays,
+                "event_bytes": EVENT_DTYPE.itemsize
+            }
+
+    def _session_lock(self, key: tuple) -> threading.Lock:
+        return self._session_locks[hash(key) % len(self._session_locks)]
+
+    def _features(self, key: tuple) -> SessionFeatures:
+        # Caller holds the session lock.
+        with self._lock:
+            features = self._sessions.get(key)
+
+            if features is not None:
+                self._sessions.move_to_end(key)
+                return features
+
+        features = SessionFeatures()
+        path = self.path_for(*key)
+
+        if os.path.exists(path):
+            events = self.read_events(*key)
+
+            # Replay chunk by chunk so cross-chunk state matches live ingest.
+            if len(events):
+                starts = np.flatnonzero(np.diff(events["seq"].astype(np.int64))) + 1
+
+                for chunk in np.split(events, starts):
+                    features.update(chunk)
+
+            with self._lock:
+                self.replays += 1
+
+        with self._lock:
+            self._sessions[key] = features
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        return features
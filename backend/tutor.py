@@ -0,0 +1,287 @@
+# backend/tutor.py
+#
+# Offline phonics tutor behind /api/chat/gemini.
+#
+# The hint corpus (content/phonics_hints.json) is compiled once at startup into
+# in-memory lookup structures:
+#
+# - a keyword map: topic words, reversal letters/words and grapheme names
+# - a grapheme trie, scanned across each word for the longest letter team at
+#   every position (sh, igh, tch, ...)
+# - a trie of reversed rimes, so the longest word-family ending of a word
+#   (cat -> -at) is one walk from its last letter
+# - a character-trigram index over the keywords, to catch misspellings
+#
+# A lookup is a handful of dict probes per word. Each answer is also split
+# into stream chunks up front, so streaming adds no work per request.
+#
+#     python tutor.py "why do I mix up b and d"
+
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+TUTOR_CORPUS_PATH = os.getenv(
+    "TUTOR_CORPUS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "content", "phonics_hints.json")
+)
+
+_WORD = re.compile(r"[a-z]+")
+
+# Chat filler that should not be read as a phonics pattern.
+STOPWORDS = frozenset("""
+    a an and are at be can do does for help how i in is it letter letters make
+    me mean my of on or read say says sound sounds spell that the this to up
+    what when why with word words you
+""".split())
+
+# Weights by how specific a match is.
+WEIGHT_REVERSAL_PAIR = 6.0
+WEIGHT_KEYWORD = 4.0
+WEIGHT_FAMILY = 2.0
+WEIGHT_GRAPHEME = 1.5
+WEIGHT_FUZZY = 3.0
+
+_END = "$"
+
+
+@dataclass(frozen=True)
+class TutorAnswer:
+    hint_id: str
+    text: str
+    chunks: Tuple[str, ...]
+    matched: Tuple[str, ...]
+
+
+def _trie_insert(trie: dict, key: str, value):
+    node = trie
+
+    for char in key:
+        node = node.setdefault(char, {})
+
+    node[_END] = value
+
+
+def _trigrams(word: str) -> List[str]:
+    padded = f" {word} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _chunk(text: str, words_per_chunk: int = 4) -> Tuple[str, ...]:
+    words = text.split(" ")
+
+    return tuple(
+        " ".join(words[i:i + words_per_chunk]) + (" " if i + words_per_chunk < len(words) else "")
+        for i in range(0, len(words), words_per_chunk)
+    )
+
+
+class TutorEngine:
+
+    def __init__(self, corpus: dict):
+        self.fallback = corpus["fallback"]
+        self.encouragements = tuple(corpus.get("encouragements") or [""])
+
+        self._texts: Dict[str, str] = {}
+        self._keywords: Dict[str, List[Tuple[str, float]]] = {}
+        self._pairs: Dict[frozenset, str] = {}
+        self._grapheme_trie: dict = {}
+        self._rime_trie: dict = {}
+        self._trigrams: Dict[str, set] = {}
+
+        for entry in corpus.get("graphemes", []):
+            hint_id = f"grapheme:{entry['grapheme']}"
+            examples = ", ".join(entry["examples"])
+            self._texts[hint_id] = f"{entry['hint']} Try: {examples}."
+            _trie_insert(self._grapheme_trie, entry["grapheme"], hint_id)
+            self._add_keyword(entry["grapheme"], hint_id, WEIGHT_KEYWORD)
+
+        for entry in corpus.get("families", []):
+            hint_id = f"family:{entry['rime']}"
+            examples = ", ".join(entry["examples"])
+            self._texts[hint_id] = (
+                f"That word is in the -{entry['rime']} family! Keep the ending and "
+                f"change the first sound: {examples}."
+            )
+            _trie_insert(self._rime_trie, entry["rime"][::-1], hint_id)
+
+        for entry in corpus.get("reversals", []):
+            hint_id = "reversal:" + "-".join(entry["pair"])
+            self._texts[hint_id] = entry["hint"]
+            self._pairs[frozenset(entry["pair"])] = hint_id
+
+            for item in entry["pair"]:
+                self._add_keyword(item, hint_id, WEIGHT_KEYWORD / 2)
+
+        for entry in corpus.get("topics", []):
+            hint_id = f"topic:{entry['keywords'][0]}"
+            self._texts[hint_id] = entry["hint"]
+
+            for keyword in entry["keywords"]:
+                self._add_keyword(keyword, hint_id, WEIGHT_KEYWORD)
+
+        for keyword in self._keywords:
+            if len(keyword) >= 4:
+                for gram in _trigrams(keyword):
+                    self._trigrams.setdefault(gram, set()).add(keyword)
+
+        self._answers: Dict[Tuple[str, int], TutorAnswer] = {}
+
+    @classmethod
+    def load(cls, path: str = TUTOR_CORPUS_PATH) -> "TutorEngine":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _add_keyword(self, keyword: str, hint_id: str, weight: float):
+        self._keywords.setdefault(keyword, []).append((hint_id, weight))
+
+    # --- MATCHING ---
+
+    def _graphemes_in(self, word: str) -> List[str]:
+        """Longest grapheme starting at each position of `word`."""
+        found = []
+        i = 0
+
+        while i < len(word):
+            node = self._grapheme_trie
+            match, length = None, 0
+
+            for j in range(i, len(word)):
+                node = node.get(word[j])
+
+                if node is None:
+                    break
+
+                if _END in node:
+                    match, length = node[_END], j - i + 1
+
+            if match:
+                found.append(match)
+                i += length
+            else:
+                i += 1
+
+        return found
+
+    def _family_of(self, word: str) -> Optional[str]:
+        node, match = self._rime_trie, None
+
+        for char in reversed(word):
+            node = node.get(char)
+
+            if node is None:
+                break
+
+            if _END in node:
+                match = node[_END]
+
+        # Only three-letter CVC words; "ship" is a sh word, not an -ip one.
+        return match if match and len(word) == 3 else None
+
+    def _fuzzy(self, word: str) -> Optional[str]:
+        grams = _trigrams(word)
+        counts: Dict[str, int] = {}
+
+        for gram in grams:
+            for keyword in self._trigrams.get(gram, ()):
+                counts[keyword] = counts.get(keyword, 0) + 1
+
+        best, best_score = None, 0.5
+
+        for keyword, shared in counts.items():
+            score = shared / (len(grams) + len(keyword) + 2 - shared)
+
+            if score > best_score:
+                best, best_score = keyword, score
+
+        return best
+
+    def scores(self, message: str) -> Tuple[Dict[str, float], List[str]]:
+        tokens = _WORD.findall(message.lower())
+        token_set = set(tokens)
+        scores: Dict[str, float] = {}
+        matched: List[str] = []
+
+        def add(hint_id, weight, reason):
+            scores[hint_id] = scores.get(hint_id, 0.0) + weight
+            matched.append(reason)
+
+        for pair, hint_id in self._pairs.items():
+            if pair <= token_set:
+                add(hint_id, WEIGHT_REVERSAL_PAIR, "/".join(sorted(pair)))
+
+        for token in tokens:
+            if token in STOPWORDS:
+                continue
+
+            keyword_hits = self._keywords.get(token)
+
+            if keyword_hits:
+                for hint_id, weight in keyword_hits:
+                    add(hint_id, weight, token)
+                continue
+
+            if len(token) < 2:
+                continue
+
+            keyword = self._fuzzy(token) if len(token) >= 4 else None
+
+            if keyword:
+                for hint_id, _ in self._keywords[keyword]:
+                    add(hint_id, WEIGHT_FUZZY, f"{token}~{keyword}")
+                continue
+
+            family = self._family_of(token)
+
+            if family:
+                add(family, WEIGHT_FAMILY, token)
+
+            for hint_id in self._graphemes_in(token):
+                add(hint_id, WEIGHT_GRAPHEME, token)
+
+        return scores, matched
+
+    def answer(self, message: str) -> TutorAnswer:
+        scores, matched = self.scores(message)
+
+        if not scores:
+            hint_id, text = "fallback", self.fallback
+        else:
+            # Highest score; earliest match wins ties.
+            hint_id = max(scores, key=scores.get)
+            text = self._texts[hint_id]
+
+        # A stable, message-dependent encouragement, so replies vary a little.
+        flavour = sum(map(ord, message)) % len(self.encouragements)
+        key = (hint_id, flavour)
+        cached = self._answers.get(key)
+
+        if cached is None:
+            opener = self.encouragements[flavour] if hint_id != "fallback" else ""
+            full = f"{opener} {text}".strip()
+            cached = self._answers[key] = TutorAnswer(hint_id, full, _chunk(full), ())
+
+        return TutorAnswer(cached.hint_id, cached.text, cached.chunks, tuple(dict.fromkeys(matched)))
+
+    def stream(self, message: str) -> Iterator[str]:
+        yield from self.answer(message).chunks
+
+
+if __name__ == "__main__":
+    engine = TutorEngine.load()
+    message = " ".join(sys.argv[1:]) or "why do I mix up b and d"
+
+    result = engine.answer(message)
+    print(f"{result.hint_id}: {result.text}  (matched {', '.join(result.matched) or '-'})")
+
+    rounds = 20000
+    started = time.perf_counter()
+
+    for _ in range(rounds):
+        engine.answer(message)
+
+    print(f"{(time.perf_counter() - started) / rounds * 1e6:.1f} us per lookup")
@@ -88,7 +88,7 @@ export default function DashboardPage() {
       }
 
       try {
-        const historyRes = await fetch("http://127.0.0.1:8000/api/assessment/history", {
+        const historyRes = await fetch("http://127.0.0.1:8000/api/assessment/history?latest=1", {
           headers: { Authorization: `Bearer ${token}` },
         });
 
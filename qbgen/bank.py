@@ -0,0 +1,403 @@
+# qbgen/bank.py
+#
+# Parsed question banks for the QB generator (a.py).
+#
+# parse_bank streams word/document.xml out of the DOCX zip with iterparse and
+# never builds a python-docx Document. Each top-level table row is handled
+# when its closing tag arrives, and each cell's text is computed once. The
+# row is then cleared, so peak memory is one row, not the whole bank.
+#
+# Images stay on disk. A question keeps the relationship IDs of its
+# pictures, and the media parts they reference are streamed out of the
+# upload into a small media-only zip in QB_MEDIA_DIR, named by the bank's
+# digest. ParsedBank.open_media() opens that file, and the assembler reads a
+# part only when its question is placed in a paper. Neither the upload nor
+# any image is held in memory or in the cache pickles.
+#
+# A parsed bank is plain and picklable: per question the unit/CO/Bloom
+# metadata, the cell as a serialized <w:tc> fragment, and image rIds, plus
+# the path of its media zip.
+#
+# BankCache keys parsed banks by the SHA-256 of the uploaded file, in an
+# in-memory LRU and optionally as pickles in a directory (QB_CACHE_DIR), so
+# regenerating with different settings never parses the same bank twice.
+
+import hashlib
+import os
+import pickle
+import posixpath
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Callable, Dict, List, Optional
+
+from lxml import etree
+
+QB_CACHE_DIR = os.getenv("QB_CACHE_DIR")
+QB_CACHE_MAX_BANKS = int(os.getenv("QB_CACHE_MAX_BANKS", "8"))
+# One <digest>.media.zip per distinct bank; defaults next to the pickles.
+QB_MEDIA_DIR = os.getenv("QB_MEDIA_DIR") or QB_CACHE_DIR or os.path.join(tempfile.gettempdir(), "qbgen-media")
+
+# Part of the pickle file name; bump when ParsedBank changes shape.
+CACHE_FORMAT = 3
+
+BLOOM_RE = re.compile(r'K\s*([1-6])', re.I)
+CO_RE = re.compile(r'CO\s*[_:]?\s*(\d+)', re.I)
+UNIT_RE = re.compile(r'Unit\s*[-:]?\s*(\d+)', re.I)
+DIGIT_ONLY_RE = re.compile(r'^\s*(\d+)\s*$')
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS = "word/_rels/document.xml.rels"
+
+_PICTURE_RIDS = etree.XPath(
+    ".//*[local-name()='blip']/@r:embed",
+    namespaces={"r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships"}
+)
+
+# What python-docx's Run.text maps each inner-content element to.
+_RUN_TEXT = {
+    W + "tab": "\t",
+    W + "ptab": "\t",
+    W + "cr": "\n",
+    W + "noBreakHyphen": "-"
+}
+
+
+def bank_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class ParsedBank:
+    digest: str
+    # {"id", "unit", "co", "bloom", "xml": <w:tc> bytes, "images": [rId]}
+    questions: List[dict]
+    # rId -> zip member of each image the questions reference
+    image_parts: Dict[str, str] = field(default_factory=dict)
+    # Zip holding just those members, under their original names
+    media_path: str = ""
+
+    def open_media(self) -> zipfile.ZipFile:
+        return zipfile.ZipFile(self.media_path)
+
+    def image(self, rId: str) -> bytes:
+        with self.open_media() as media:
+            return media.read(self.image_parts[rId])
+
+
+def question_metadata(cells_text: List[str]) -> Optional[dict]:
+    """Unit, CO and Bloom level of a bank row, or None when it is not a question."""
+    if not any(cells_text):
+        return None
+
+    joined = " ".join(cells_text)
+    bm = BLOOM_RE.search(joined)
+    if not bm:
+        return None
+
+    # Check for "Unit X" or a standalone digit in cells
+    unit_val = None
+    um = UNIT_RE.search(joined)
+    if um:
+        unit_val = int(um.group(1))
+    else:
+        for txt in cells_text:
+            dm = DIGIT_ONLY_RE.match(txt)
+            if dm:
+                unit_val = int(dm.group(1))
+                break
+
+    cm = CO_RE.search(joined)
+
+    return {
+        "unit": unit_val,
+        "co": int(cm.group(1)) if cm else None,
+        "bloom": int(bm.group(1))
+    }
+
+
+def _run_text(r) -> str:
+    parts = []
+
+    for child in r:
+        if child.tag == W + "t":
+            parts.append(child.text or "")
+        elif child.tag == W + "br":
+            parts.append("\n" if child.get(W + "type", "textWrapping") == "textWrapping" else "")
+        else:
+            parts.append(_RUN_TEXT.get(child.tag, ""))
+
+    return "".join(parts)
+
+
+def cell_text(tc) -> str:
+    """Same text as python-docx's _Cell.text, in one pass over the cell."""
+    paragraphs = []
+
+    for p in tc.iterchildren(W + "p"):
+        parts = []
+
+        for child in p.iterchildren(W + "r", W + "hyperlink"):
+            if child.tag == W + "r":
+                parts.append(_run_text(child))
+            else:
+                parts.extend(_run_text(r) for r in child.iterchildren(W + "r"))
+
+        paragraphs.append("".join(parts))
+
+    return "\n".join(paragraphs)
+
+
+def _freeze(tc) -> tuple:
+    """(<w:tc> bytes, picture rIds) of a cell."""
+    return etree.tostring(tc), [str(rId) for rId in _PICTURE_RIDS(tc)]
+
+
+def _row_cells(tr, merged: Dict[int, tuple]) -> List[tuple]:
+    """
+    (text, tc or frozen cell) per grid column, like python-docx's row.cells:
+    spanned cells repeat and vertically merged cells read as their top cell.
+    `merged` carries the top cells of open vertical merges between rows.
+    """
+    cells = []
+    col = 0
+
+    trPr = tr.find(W + "trPr")
+    if trPr is not None:
+        before = trPr.find(W + "gridBefore")
+        if before is not None:
+            col = int(before.get(W + "val", "0"))
+
+    for tc in tr.iterchildren(W + "tc"):
+        span, vmerge = 1, None
+        tcPr = tc.find(W + "tcPr")
+
+        if tcPr is not None:
+            grid_span = tcPr.find(W + "gridSpan")
+            if grid_span is not None:
+                span = max(1, int(grid_span.get(W + "val", "1")))
+
+            v_merge = tcPr.find(W + "vMerge")
+            if v_merge is not None:
+                vmerge = v_merge.get(W + "val", "continue")
+
+        if vmerge == "continue" and col in merged:
+            cell = merged[col]
+        else:
+            text = cell_text(tc).strip()
+
+            if vmerge == "restart":
+                # Frozen now: this row's elements are cleared once it is parsed.
+                cell = merged[col] = (text, _freeze(tc))
+            else:
+                cell = (text, tc)
+                merged.pop(col, None)
+
+        cells.extend([cell] * span)
+        col += span
+
+    return cells
+
+
+def _image_parts(zf: zipfile.ZipFile) -> Dict[str, str]:
+    if DOCUMENT_RELS not in zf.namelist():
+        return {}
+
+    parts = {}
+
+    for rel in etree.fromstring(zf.read(DOCUMENT_RELS)).iter(PKG_REL):
+        if rel.get("TargetMode") == "External" or not rel.get("Type", "").endswith("/image"):
+            continue
+
+        target = rel.get("Target", "")
+        member = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("word", target))
+        parts[rel.get("Id")] = member
+
+    return parts
+
+
+def _write_media(zf: zipfile.ZipFile, members, path: str):
+    """Copies `members` into a new zip at `path`, a chunk at a time."""
+    if os.path.exists(path):
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as out:
+        for member in sorted(members):
+            with zf.open(member) as src, out.open(member, "w") as dst:
+                shutil.copyfileobj(src, dst)
+
+    os.replace(tmp, path)
+
+
+def parse_bank(data: bytes, media_dir: str = QB_MEDIA_DIR) -> ParsedBank:
+    digest = bank_digest(data)
+    media_path = os.path.join(media_dir, f"{digest}.media.zip")
+    questions = []
+
+    with zipfile.ZipFile(BytesIO(data)) as zf:
+        image_parts = _image_parts(zf)
+
+        with zf.open(DOCUMENT_PART) as xml:
+            table, merged = None, {}
+
+            for _, tr in etree.iterparse(xml, events=("end",), tag=W + "tr", huge_tree=True):
+                tbl = tr.getparent()
+
+                # Rows of tables nested in a cell belong to the outer row.
+                if tbl.getparent() is None or tbl.getparent().tag != W + "body":
+                    continue
+
+                if tbl is not table:
+                    table, merged = tbl, {}
+
+                cells = _row_cells(tr, merged)
+                meta = question_metadata([text for text, _ in cells])
+
+                if meta is not None and cells:
+                    # The question is usually in the cell with the most text
+                    _, main = max(cells, key=lambda cell: len(cell[0]))
+                    xml_bytes, rIds = main if isinstance(main, tuple) else _freeze(main)
+
+                    questions.append({
+                        "id": len(questions) + 1,
+                        **meta,
+                        "xml": xml_bytes,
+                        "images": [rId for rId in rIds if rId in image_parts]
+                    })
+
+                # Drop everything parsed so far: this row, earlier rows and
+                # the body content before this table.
+                tr.clear()
+                while tr.getprevious() is not None:
+                    del tbl[0]
+                while tbl.getprevious() is not None:
+                    del tbl.getparent()[0]
+
+        used = {rId for q in questions for rId in q["images"]}
+        present = set(zf.namelist())
+        image_parts = {
+            rId: member for rId, member in image_parts.items()
+            if rId in used and member in present
+        }
+        _write_media(zf, set(image_parts.values()), media_path)
+
+    return ParsedBank(digest, questions, image_parts, media_path)
+
+
+class BankCache:
+
+    def __init__(self, max_entries: int = QB_CACHE_MAX_BANKS, directory: Optional[str] = QB_CACHE_DIR):
+        self.max_entries = max_entries
+        self.directory = directory
+
+        self._entries: "OrderedDict[str, ParsedBank]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_or_parse(self, data: bytes, parse: Callable[[bytes], ParsedBank] = parse_bank) -> ParsedBank:
+        digest = bank_digest(data)
+
+        with self._lock:
+            bank = self._entries.get(digest)
+
+            if bank is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return bank
+
+        bank = self._load(digest)
+
+        if bank is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            bank = parse(data)
+            self._save(bank)
+
+            with self._lock:
+                self.misses += 1
+
+        with self._lock:
+            self._entries[digest] = bank
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return bank
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "banks": len(self._entries),
+                "max_banks": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "directory": self.directory
+            }
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.v{CACHE_FORMAT}.pkl")
+
+    def _load(self, digest: str) -> Optional[ParsedBank]:
+        if not self.directory:
+            return None
+
+        try:
+            with open(self._path(digest), "rb") as f:
+                bank = pickle.load(f)
+
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+        usable = (
+            isinstance(bank, ParsedBank)
+            and bank.digest == digest
+            and os.path.exists(bank.media_path)
+        )
+
+        return bank if usable else None
+
+    def _save(self, bank: ParsedBank):
+        if not self.directory:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(bank.digest)
+
+        # Written aside and renamed, so a reader never sees half a file.
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(bank, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+
+    cache = BankCache(directory=None)
+
+    for _ in range(2):
+        started = time.perf_counter()
+        bank = cache.get_or_parse(data)
+        print(f"{len(bank.questions)} questions, {len(bank.image_parts)} images in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    print(cache.stats())
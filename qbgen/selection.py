@@ -0,0 +1,298 @@
+# qbgen/selection.py
+#
+# Question selection for all sets of a paper at once. Importable without
+# Streamlit:
+#
+#     index = SlotIndex(bank.questions, template.slots, part_c_unit)
+#     plans = SetPlanner(index).plan(n_sets, seed=1)
+#
+# SlotIndex is built once per bank and template and shared by every set. It
+# maps each slot to a requirement key, (unit, allowed Bloom levels), and each
+# key to its pool of questions. Pools are built by ANDing per-unit and
+# per-Bloom bitsets (Python ints over question indices). OR slots are paired
+# in one pass over the slot list.
+#
+# SetPlanner deals every pool like a deck. Each pool keeps a DrawPool of the
+# questions not yet dealt this round, which gives O(1) random draw and
+# removal. A dealt question leaves the round of every pool that holds it. A
+# pool is refilled only once all of its questions have had a turn, so no
+# question is used again while another in its pool is still unused. That
+# makes cross-set repetition the least the bank allows. Within a set a
+# question is never repeated while its pool has others, and the two
+# alternatives of an OR pair always differ. Runs with the same seed pick the
+# same questions.
+
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Stands in for a question when the bank has none for a slot.
+UNIT_NOT_FOUND = "UNIT_NOT_FOUND"
+
+
+def allowed_blooms_for_slot_num(slot_num):
+    if 1 <= slot_num <= 10:
+        return [1, 2, 3]
+    if 11 <= slot_num <= 20:
+        return [4, 5]
+    if 21 <= slot_num <= 22:
+        return [6]
+    return [1, 2, 3, 4, 5, 6]
+
+
+def allowed_unit_for_slot_num(slot_num, part_c_unit):
+    # Rule: q1,2->U1, q3,4->U2, q5,6->U3, q7,8->U4, q9,10->U5
+    # Same pattern repeats for q11-q20
+    if slot_num in [1, 2, 11, 12]: return 1
+    if slot_num in [3, 4, 13, 14]: return 2
+    if slot_num in [5, 6, 15, 16]: return 3
+    if slot_num in [7, 8, 17, 18]: return 4
+    if slot_num in [9, 10, 19, 20]: return 5
+    if slot_num in [21, 22]: return part_c_unit
+    return None
+
+
+def slot_coord(slot: dict) -> tuple:
+    return (slot["table_index"], slot["row_index"], slot["cell_index"])
+
+
+def find_or_pairs(slots: Sequence[dict]) -> List[Tuple[dict, dict]]:
+    """(numbered slot before, numbered slot after) for every OR marker, in one pass."""
+    pairs = []
+    previous = None
+    pending = []
+
+    for s in slots:
+        if s["is_or"]:
+            if previous is not None:
+                pending.append(previous)
+        elif s.get("slot_num"):
+            pairs.extend((left, s) for left in pending)
+            pending = []
+            previous = s
+
+    return pairs
+
+
+def bits_to_indices(bits: int) -> List[int]:
+    indices = []
+
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+
+    return indices
+
+
+class DrawPool:
+    """A set with O(1) add, remove and uniform random draw."""
+
+    __slots__ = ("items", "positions")
+
+    def __init__(self, items=()):
+        self.items = list(dict.fromkeys(items))
+        self.positions = {item: i for i, item in enumerate(self.items)}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def remove(self, item) -> bool:
+        i = self.positions.pop(item, None)
+        if i is None:
+            return False
+
+        # Move the last item into the hole.
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.positions[last] = i
+
+        return True
+
+    def draw(self, rng: random.Random):
+        """A random item, left in the pool."""
+        return self.items[rng.randrange(len(self.items))]
+
+
+class SlotIndex:
+
+    def __init__(self, questions: Sequence[dict], slots: Sequence[dict], part_c_unit: int):
+        self.questions = [q for q in questions if q["unit"] is not None]
+        self.part_c_unit = part_c_unit
+
+        # Filter entries to only include those with slot numbers
+        self.entries = [s for s in slots if s.get("slot_num")]
+        self.or_pairs = find_or_pairs(slots)
+
+        unit_bits: Dict[int, int] = {}
+        bloom_bits: Dict[int, int] = {}
+
+        for idx, q in enumerate(self.questions):
+            unit_bits[q["unit"]] = unit_bits.get(q["unit"], 0) | (1 << idx)
+            bloom_bits[q["bloom"]] = bloom_bits.get(q["bloom"], 0) | (1 << idx)
+
+        self.keys: Dict[tuple, tuple] = {}
+        self.pools: Dict[tuple, List[int]] = {}
+
+        for e in self.entries:
+            key = self.slot_key(e["slot_num"])
+            self.keys[slot_coord(e)] = key
+
+            if key not in self.pools:
+                unit, blooms = key
+                allowed = 0
+                for b in blooms:
+                    allowed |= bloom_bits.get(b, 0)
+
+                self.pools[key] = bits_to_indices(unit_bits.get(unit, 0) & allowed)
+
+        # Keys whose pool holds each question
+        self.keys_of: Dict[int, List[tuple]] = {}
+        for key, pool in self.pools.items():
+            for idx in pool:
+                self.keys_of.setdefault(idx, []).append(key)
+
+        # Scarce pools first, so they are not starved by broader ones.
+        demand: Dict[tuple, int] = {}
+        for key in self.keys.values():
+            demand[key] = demand.get(key, 0) + 1
+
+        self.order = sorted(
+            self.keys,
+            key=lambda coord: (len(self.pools[self.keys[coord]]) / demand[self.keys[coord]], coord)
+        )
+
+    def slot_key(self, slot_num: int) -> tuple:
+        return (
+            allowed_unit_for_slot_num(slot_num, self.part_c_unit),
+            tuple(allowed_blooms_for_slot_num(slot_num))
+        )
+
+
+class SetPlanner:
+
+    def __init__(self, index: SlotIndex):
+        self.index = index
+
+    def plan(self, n_sets: int, seed: Optional[int] = None) -> List[Dict[tuple, object]]:
+        """
+        One {slot coordinate: question dict or UNIT_NOT_FOUND} per set, for
+        the index's numbered slots.
+        """
+        index = self.index
+        rng = random.Random(seed)
+        usage = [0] * len(index.questions)
+
+        # Questions each pool has not dealt yet this round
+        undealt = {key: DrawPool(pool) for key, pool in index.pools.items() if pool}
+
+        partner = {}
+        for left, right in index.or_pairs:
+            partner[slot_coord(left)] = slot_coord(right)
+            partner[slot_coord(right)] = slot_coord(left)
+
+        plans = []
+
+        for _ in range(n_sets):
+            picks: Dict[tuple, int] = {}
+            used = 0
+
+            for coord in index.order:
+                key = index.keys[coord]
+
+                if key not in undealt:
+                    continue
+
+                idx = self._deal(key, undealt, used, rng)
+
+                if idx is None:
+                    # Pool smaller than this set's demand: repeat its least
+                    # used question, but never the OR alternative's.
+                    pool = index.pools[key]
+                    avoid = picks.get(partner.get(coord))
+                    candidates = [i for i in pool if i != avoid] or pool
+                    idx = min(candidates, key=lambda i: (usage[i], rng.random()))
+
+                picks[coord] = idx
+                used |= 1 << idx
+                usage[idx] += 1
+
+            plans.append({
+                coord: index.questions[picks[coord]] if coord in picks else UNIT_NOT_FOUND
+                for coord in index.keys
+            })
+
+        return plans
+
+    def _deal(self, key: tuple, undealt: Dict[tuple, DrawPool], used: int, rng: random.Random) -> Optional[int]:
+        """A question from `key`'s round not already in the set `used`, or None."""
+        remaining = undealt[key]
+        set_aside = []
+        idx = None
+
+        for refill in (False, True):
+            if refill:
+                # Round over: every question in the pool gets a new turn.
+                for i in self.index.pools[key]:
+                    remaining.add(i)
+
+            while remaining:
+                candidate = remaining.draw(rng)
+
+                if (used >> candidate) & 1:
+                    remaining.remove(candidate)
+                    set_aside.append(candidate)
+                    continue
+
+                idx = candidate
+                break
+
+            if idx is not None:
+                break
+
+        # Skipped only for this set; still due this round.
+        for i in set_aside:
+            remaining.add(i)
+
+        if idx is not None:
+            for other in self.index.keys_of[idx]:
+                undealt[other].remove(idx)
+
+        return idx
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    n_questions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_sets = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    rng = random.Random(0)
+    bank = [
+        {"id": i + 1, "unit": rng.randint(1, 5), "co": 1, "bloom": rng.randint(1, 6)}
+        for i in range(n_questions)
+    ]
+    slots = []
+    for n in range(1, 23):
+        if n > 11 and n % 2 == 0:
+            slots.append({"table_index": 0, "row_index": 2 * n - 1, "cell_index": 0, "slot_num": None, "is_or": True})
+        slots.append({"table_index": 0, "row_index": 2 * n, "cell_index": 0, "slot_num": n, "is_or": False})
+
+    started = time.perf_counter()
+    plans = SetPlanner(SlotIndex(bank, slots, part_c_unit=5)).plan(n_sets, seed=1)
+    elapsed = time.perf_counter() - started
+
+    ids = [q["id"] for plan in plans for q in plan.values() if q != UNIT_NOT_FOUND]
+    print(
+        f"{n_sets} sets from {n_questions} questions in {elapsed * 1000:.1f} ms, "
+        f"repetition {(len(ids) - len(set(ids))) / len(ids) * 100:.2f}%"
+    )
@@ -0,0 +1,386 @@
+# qbgen/template.py
+#
+# Question-paper templates, compiled once and filled many times.
+#
+# compile_template parses the template DOCX a single time. It finds the
+# question slots, then serializes word/document.xml with the question, CO
+# and Bloom cells of every slot row cut out. The result is a list of byte
+# segments. Filling a set means joining those segments with each slot's
+# cell content; the XML tree is never re-parsed or copied.
+#
+# A question's cell content is built once per process and reused across
+# sets. Its pictures are copied into the paper's package as new media
+# parts, with their r:embed IDs remapped, so they keep their size and
+# position from the bank.
+#
+# assemble_sets fills the sets in a spawned process pool (QB_WORKERS) once
+# there are at least QB_POOL_MIN_SETS of them. Each worker receives the
+# compiled template and the bank once, at start-up; per set it only gets the
+# question ID chosen for each slot.
+
+import mimetypes
+import multiprocessing
+import os
+import posixpath
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from qbgen.bank import DOCUMENT_PART, DOCUMENT_RELS, W, ParsedBank, cell_text
+from qbgen.selection import UNIT_NOT_FOUND
+
+QB_WORKERS = int(os.getenv("QB_WORKERS", str(os.cpu_count() or 1)))
+# Spawning a worker costs a fresh interpreter (~0.5 s); smaller runs stay serial.
+QB_POOL_MIN_SETS = int(os.getenv("QB_POOL_MIN_SETS", "64"))
+
+NUM_PREFIX_RE = re.compile(r'^\s*(\d+)\s*[\.\)]')
+OR_MARKERS = ("OR", "(OR)", "( OR )")
+
+CONTENT_TYPES_PART = "[Content_Types].xml"
+IMAGE_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+R_EMBED = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
+
+# Office formats mimetypes does not know.
+IMAGE_CONTENT_TYPES = {"emf": "image/x-emf", "wmf": "image/x-wmf"}
+
+# Media that is already compressed is stored, not deflated again.
+STORED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+
+_MARKER_RE = re.compile(rb"<!--qbslot(\d+)-->")
+
+_PICTURE_EMBEDS = etree.XPath(
+    ".//*[local-name()='blip'][@r:embed]",
+    namespaces={"r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships"}
+)
+_DOC_PROPERTIES = etree.XPath(".//*[local-name()='docPr']")
+
+# Drawing IDs for inserted pictures start above anything a template uses.
+DOC_PR_BASE = 1_000_000
+
+
+def parse_template_slots(body) -> List[dict]:
+    """Numbered ("1.", "2)") and OR cells of every top-level table, in document order."""
+    slots = []
+
+    for ti, tbl in enumerate(body.iterchildren(W + "tbl")):
+        for ri, tr in enumerate(tbl.iterchildren(W + "tr")):
+            for ci, tc in enumerate(tr.iterchildren(W + "tc")):
+                txt = cell_text(tc).strip()
+                if not txt:
+                    continue
+
+                if txt.upper() in OR_MARKERS:
+                    slots.append({
+                        "table_index": ti,
+                        "row_index": ri,
+                        "cell_index": ci,
+                        "slot_num": None,
+                        "is_or": True
+                    })
+                    continue
+
+                m = NUM_PREFIX_RE.match(txt)
+                if m:
+                    slots.append({
+                        "table_index": ti,
+                        "row_index": ri,
+                        "cell_index": ci,
+                        "slot_num": int(m.group(1)),
+                        "is_or": False
+                    })
+    return slots
+
+
+@dataclass
+class CompiledTemplate:
+    slots: List[dict]
+    # document.xml split around the cut-out cells; len(cells) + 1 pieces
+    segments: List[bytes]
+    # Original content of each cut-out cell, used when a slot is left unfilled
+    cells: List[bytes]
+    # (table, row) -> indices into `cells` of its question, CO and Bloom cells
+    rows: Dict[Tuple[int, int], Tuple[int, int, int]]
+    # Every other part of the package, unchanged
+    parts: Dict[str, bytes] = field(default_factory=dict)
+    image_extensions: frozenset = frozenset()
+
+
+def compile_template(data: bytes) -> CompiledTemplate:
+    with zipfile.ZipFile(BytesIO(data)) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+
+    root = etree.fromstring(parts.pop(DOCUMENT_PART))
+    body = root.find(W + "body")
+    slots = parse_template_slots(body)
+
+    tables = list(body.iterchildren(W + "tbl"))
+    cells, rows = [], {}
+
+    for slot in slots:
+        key = (slot["table_index"], slot["row_index"])
+        if slot["is_or"] or key in rows:
+            continue
+
+        tcs = list(list(tables[key[0]].iterchildren(W + "tr"))[key[1]].iterchildren(W + "tc"))
+
+        # Ensure row has enough columns (Number, Question, CO, Bloom)
+        if len(tcs) < 4:
+            continue
+
+        indices = []
+
+        for tc in tcs[1:4]:
+            content = [child for child in tc if child.tag != W + "tcPr"]
+            cells.append(b"".join(etree.tostring(child) for child in content))
+
+            for child in content:
+                tc.remove(child)
+
+            tc.append(etree.Comment(f"qbslot{len(cells) - 1}"))
+            indices.append(len(cells) - 1)
+
+        rows[key] = tuple(indices)
+
+    document = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+    pieces = _MARKER_RE.split(document)
+
+    content_types = etree.fromstring(parts[CONTENT_TYPES_PART])
+    extensions = frozenset(
+        element.get("Extension", "").lower()
+        for element in content_types
+        if element.tag.endswith("Default")
+    )
+
+    return CompiledTemplate(
+        slots=slots,
+        segments=pieces[0::2],
+        cells=cells,
+        rows=rows,
+        parts=parts,
+        image_extensions=extensions
+    )
+
+
+def _paragraph(text: str) -> bytes:
+    if not text:
+        return b"<w:p/>"
+
+    return f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'.encode("utf-8")
+
+
+class Assembler:
+    """Fills one compiled template from one bank; keeps per-question fills."""
+
+    def __init__(self, template: CompiledTemplate, bank: ParsedBank):
+        self.template = template
+        self.bank = bank
+
+        self._questions = {q["id"]: q for q in bank.questions}
+        self._fills: Dict[int, Tuple[bytes, List[Tuple[str, str, str]]]] = {}
+        self._media: Optional[zipfile.ZipFile] = None
+
+    def question_fill(self, qid: int) -> Tuple[bytes, List[Tuple[str, str, str]]]:
+        """(cell content, [(new rId, bank rId, new media part)]) for one question."""
+        fill = self._fills.get(qid)
+        if fill is not None:
+            return fill
+
+        tc = etree.fromstring(self._questions[qid]["xml"])
+        images = []
+
+        for k, blip in enumerate(_PICTURE_EMBEDS(tc)):
+            rId = blip.get(R_EMBED)
+            member = self.bank.image_parts.get(rId)
+            if member is None:
+                continue
+
+            ext = posixpath.splitext(member)[1].lower()
+            new_rId = f"rIdQB{qid}x{k}"
+            images.append((new_rId, rId, f"word/media/qb{qid}x{k}{ext}"))
+            blip.set(R_EMBED, new_rId)
+
+        for k, doc_pr in enumerate(_DOC_PROPERTIES(tc)):
+            doc_pr.set("id", str(DOC_PR_BASE + qid * 64 + k))
+
+        content = [child for child in tc if child.tag != W + "tcPr"]
+        xml = b"".join(etree.tostring(child) for child in content)
+
+        # A cell must end with a paragraph.
+        if not content or content[-1].tag != W + "p":
+            xml += b"<w:p/>"
+
+        fill = self._fills[qid] = (xml, images)
+        return fill
+
+    def image(self, rId: str) -> bytes:
+        """A bank picture's bytes, read from the media zip when it is placed."""
+        if self._media is None:
+            self._media = self.bank.open_media()
+
+        return self._media.read(self.bank.image_parts[rId])
+
+    def assemble(self, selected: Dict[tuple, object]) -> bytes:
+        """
+        `selected` maps slot coordinates (table, row, cell) to a question ID or
+        UNIT_NOT_FOUND, as SetPlanner.plan gives with IDs for questions. Returns
+        the DOCX bytes.
+        """
+        template = self.template
+        cells = list(template.cells)
+        images = {}
+
+        for (ti, ri, _), qid in selected.items():
+            indices = template.rows.get((ti, ri))
+            if indices is None:
+                continue
+
+            q_index, co_index, k_index = indices
+
+            if qid == UNIT_NOT_FOUND:
+                cells[q_index] = _paragraph("unit not in given qb")
+                cells[co_index] = cells[k_index] = _paragraph("")
+                continue
+
+            q = self._questions[qid]
+            cells[q_index], question_images = self.question_fill(qid)
+            cells[co_index] = _paragraph(f"CO{q.get('co') or ''}")
+            cells[k_index] = _paragraph(f"K{q.get('bloom') or ''}")
+
+            for new_rId, rId, member in question_images:
+                images[new_rId] = (rId, member)
+
+        pieces = [template.segments[0]]
+        for cell, segment in zip(cells, template.segments[1:]):
+            pieces.append(cell)
+            pieces.append(segment)
+
+        return self._package(b"".join(pieces), images)
+
+    def _package(self, document: bytes, images: Dict[str, Tuple[str, str]]) -> bytes:
+        parts = self.template.parts
+        rels = parts.get(DOCUMENT_RELS, b"")
+        content_types = parts[CONTENT_TYPES_PART]
+
+        if images:
+            rels = rels.replace(b"</Relationships>", b"".join(
+                f'<Relationship Id="{new_rId}" Type="{IMAGE_REL_TYPE}" '
+                f'Target="{posixpath.relpath(member, "word")}"/>'.encode("utf-8")
+                for new_rId, (_, member) in images.items()
+            ) + b"</Relationships>")
+
+            missing = {
+                posixpath.splitext(member)[1][1:].lower()
+                for _, member in images.values()
+            } - self.template.image_extensions
+
+            if missing:
+                content_types = content_types.replace(b"</Types>", b"".join(
+                    f'<Default Extension="{ext}" ContentType="{_content_type(ext)}"/>'.encode("utf-8")
+                    for ext in sorted(missing)
+                ) + b"</Types>")
+
+        buf = BytesIO()
+
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as out:
+            out.writestr(CONTENT_TYPES_PART, content_types)
+
+            for name, data in parts.items():
+                if name == CONTENT_TYPES_PART:
+                    continue
+                out.writestr(name, rels if name == DOCUMENT_RELS else data, compress_type=_compression(name))
+
+            out.writestr(DOCUMENT_PART, document)
+
+            for rId, member in images.values():
+                out.writestr(member, self.image(rId), compress_type=_compression(member))
+
+        return buf.getvalue()
+
+
+def _content_type(ext: str) -> str:
+    return IMAGE_CONTENT_TYPES.get(ext) or mimetypes.types_map.get("." + ext, "application/octet-stream")
+
+
+def _compression(name: str) -> int:
+    ext = posixpath.splitext(name)[1][1:].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+# --- PROCESS POOL ---
+
+_worker: Optional[Assembler] = None
+
+
+def _init_worker(template: CompiledTemplate, bank: ParsedBank):
+    global _worker
+    _worker = Assembler(template, bank)
+
+
+def _assemble_in_worker(selected: Dict[tuple, object]) -> bytes:
+    return _worker.assemble(selected)
+
+
+def assemble_sets(
+    template: CompiledTemplate,
+    bank: ParsedBank,
+    selections: List[Dict[tuple, object]],
+    workers: int = QB_WORKERS
+) -> List[bytes]:
+    """One DOCX per selection, in order; in a process pool when it pays off."""
+    workers = max(1, min(workers, len(selections)))
+
+    if workers == 1 or len(selections) < QB_POOL_MIN_SETS:
+        assembler = Assembler(template, bank)
+        return [assembler.assemble(selected) for selected in selections]
+
+    # Spawned, not forked: the Streamlit server is multi-threaded.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(template, bank)
+    ) as pool:
+        return list(pool.map(_assemble_in_worker, selections))
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from qbgen.bank import parse_bank
+
+    with open(sys.argv[1], "rb") as f:
+        template_data = f.read()
+    with open(sys.argv[2], "rb") as f:
+        parsed = parse_bank(f.read())
+
+    n_sets = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    started = time.perf_counter()
+    compiled = compile_template(template_data)
+    compiled_at = time.perf_counter()
+
+    # Question i fills every slot row in turn; enough to time the assembly.
+    slot_rows = [s for s in compiled.slots if not s["is_or"]]
+    selections = [
+        {
+            (s["table_index"], s["row_index"], s["cell_index"]): parsed.questions[(i * len(slot_rows) + j) % len(parsed.questions)]["id"]
+            for j, s in enumerate(slot_rows)
+        }
+        for i in range(n_sets)
+    ]
+
+    papers = assemble_sets(compiled, parsed, selections)
+    finished = time.perf_counter()
+
+    print(
+        f"compile {(compiled_at - started) * 1000:.1f} ms, "
+        f"{n_sets} sets in {(finished - compiled_at) * 1000:.1f} ms "
+        f"({sum(map(len, papers)) / n_sets / 1024:.0f} KiB each)"
+    )